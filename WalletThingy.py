@@ -1,15 +1,36 @@
+import argparse
+import asyncio
+import os
+import signal
+import sys
 import threading
 import time
-import shutil
-import platform
-import subprocess
-import psutil
 import logging
+
+STARTED_AT = time.monotonic()  # Before the heavier imports, for the startup time log
+
 import yaml
 
-from modules.notifications import NotificationManager
+# Only light modules here: substrateinterface, requests, psutil and NumPy are imported
+# by the code that needs them, so `query`, `--help` and restarts come up quickly
+from modules.coalescer import NotificationCoalescer
+from modules.history import HistoryStore
+from modules.scanner import EventScanner, REWARD_REASONS
+from modules.backfill import Backfill
+from modules.gpu import GpuSampler
+from modules.system_stats import SystemSampler, format_system_stats
+from modules.status_bar import StatusRenderer, create_sinks
+from modules.query_server import QueryServer, query as query_socket
+from modules.node_pool import NodePool, CONNECTION_ERRORS
+from modules.scheduler import PollScheduler, TokenBucket
+from modules.shards import ShardCoordinator, encode_changes, encode_stages, wait_for_stop, READY, STAGES_INTERVAL
+from modules.balance_table import BalanceTable, format_balance, to_planck, UNIT
+from modules.reward_stats import RewardStats, RewardAlerts, format_rewards
+from modules import metrics, profiler
+from concurrent.futures import ThreadPoolExecutor
 from itertools import cycle
-from substrateinterface import SubstrateInterface
+
+DEFAULT_METADATA_CACHE = os.path.join("~", ".cache", "wallet-thingy")
 
 def setup_logging():
     """
@@ -27,7 +48,8 @@ def load_config():
     """
     try:
         with open("config.yaml", "r") as file:
-            config = yaml.safe_load(file)
+            # libyaml's loader, when PyYAML was built with it, parses long address lists much faster
+            config = yaml.load(file, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
             return config
     except FileNotFoundError:
         logging.error("Error: config.yaml file not found. Please create the file and try again.")
@@ -44,11 +66,21 @@ def validate_config(config):
         logging.error("Error: 'node_url' is required in config.yaml.")
         exit(1)
 
+    node_url = config.get("node_url")
+    if isinstance(node_url, list) and not all(isinstance(url, str) for url in node_url):
+        logging.error("Error: 'node_url' must be a URL or a list of URLs in config.yaml.")
+        exit(1)
+
     addresses = config.get("addresses")
     if not addresses or not isinstance(addresses, list):
         logging.error("Error: 'addresses' must be a non-empty list in config.yaml.")
         exit(1)
 
+    shards = config.get("shards", 1)
+    if not isinstance(shards, int) or shards < 1:
+        logging.error("Error: 'shards' must be a whole number of at least 1 in config.yaml.")
+        exit(1)
+
 def truncate_address(address):
     """
     Truncate a wallet address for display purposes.
@@ -56,205 +88,762 @@ def truncate_address(address):
     """
     return f"{address[:4]}...{address[-4:]}"
 
+def node_connector(metadata_cache=None, rpc_limiter=None):
+    """
+    A connect(url) function for NodePool, sharing one MetadataCache (from the
+    `metadata_cache` directory, if set) and the `rpc_limiter` budget between all
+    connections. Returns (connect, cache).
+    """
+    from modules.metadata_cache import MetadataCache, CachedSubstrateInterface
+    cache = MetadataCache(metadata_cache) if metadata_cache else None
+    return (lambda url: CachedSubstrateInterface(url=url, metadata_cache=cache, rpc_limiter=rpc_limiter)), cache
+
+def query_balances(substrate, addresses, block_hash, batch_size=500, reader=None, spec=None):
+    """
+    Read the free balance (in the smallest unit) of every address at `block_hash`,
+    `batch_size` storage keys per state_queryStorageAt request. With an AccountReader,
+    precomputed keys and raw decoding are used whenever the runtime allows it; `spec`
+    is the block's runtime version, if the caller knows it.
+    """
+    if reader is not None:
+        with profiler.stage("balances.fast_path"):
+            balances = reader.query(substrate, addresses, block_hash, batch_size, spec)
+        if balances is not None:
+            return balances
+    balances = {}
+    for start in range(0, len(addresses), batch_size):
+        chunk = addresses[start:start + batch_size]
+        with profiler.stage("balances.storage_keys"):
+            storage_keys = [
+                substrate.create_storage_key('System', 'Account', [address])
+                for address in chunk
+            ]
+        # query_multi includes SCALE decoding of the results
+        with profiler.stage("balances.query_multi"), metrics.RPC_DURATION.time(call="query_multi"):
+            results = substrate.query_multi(storage_keys, block_hash=block_hash)
+        with profiler.stage("balances.convert"):
+            for address, (storage_key, result) in zip(chunk, results):
+                value = result.value if result is not None else None
+                free = value['data']['free'] if value else 0
+                balances[address] = free
+    return balances
+
 class BalanceChecker:
     def __init__(self, node_url, addresses, telegram_chat_id=None, telegram_bot_token=None, check_interval=600, 
                 pushover_app_token=None, pushover_user_key=None, notification_config=None, run_as_tmux=False, 
-                discord_webhook=None, pushbullet_token=None, ):
+                discord_webhook=None, pushbullet_token=None, batch_size=500, monitor_mode="poll",
+                resubscribe_interval=60, max_in_flight=4, health_check_interval=30, reconnect_backoff_max=60,
+                history_db=None, scan_events=False, events_follow="head", max_staleness=600, poll_backoff=1.5,
+                max_rpc_per_second=0, metadata_cache=None, shards=1, shard_node_urls=None, events_wait=60):
+        from modules.account_reader import AccountReader
+        from modules.notifications import NotificationManager
+
         self.node_url = node_url
         self.addresses = addresses
         self.check_interval = check_interval
+        self.batch_size = batch_size
+        self.monitor_mode = monitor_mode
+        self.resubscribe_interval = resubscribe_interval
+        self.max_in_flight = max_in_flight
+        self.max_staleness = max_staleness
+        self.poll_backoff = poll_backoff
+        self.rpc_limiter = TokenBucket(max_rpc_per_second) if max_rpc_per_second else None
         self.notification_config = notification_config or {}
         self.run_as_tmux = run_as_tmux
-        self.substrate = None
-        self.last_balances = {}
+        # Every node request of this process waits for it, whichever code path makes it
+        connect, self.metadata_cache = node_connector(metadata_cache, self.rpc_limiter)
+        self.pool = NodePool(
+            node_url,
+            connect=connect,
+            health_check_interval=health_check_interval,
+            backoff_max=reconnect_backoff_max,
+        )
+        self.shards = None
+        if shards > 1:
+            # Shard processes do the node queries; this process only applies their changes
+            self.shards = ShardCoordinator(addresses, shards, run_shard, {
+                "node_url": node_url,
+                "check_interval": check_interval,
+                "batch_size": batch_size,
+                "monitor_mode": monitor_mode,
+                "resubscribe_interval": resubscribe_interval,
+                "max_in_flight": max_in_flight,
+                "health_check_interval": health_check_interval,
+                "reconnect_backoff_max": reconnect_backoff_max,
+                "max_staleness": max_staleness,
+                "poll_backoff": poll_backoff,
+                "max_rpc_per_second": max_rpc_per_second / shards,
+                "metadata_cache": metadata_cache,
+                "log_level": logging.getLogger().level,
+                "profile": profiler.PROFILER.enabled,
+            }, node_urls=shard_node_urls, on_stages=profiler.PROFILER.merge)
+        self.account_reader = AccountReader([] if self.shards else addresses, cache=self.metadata_cache)
+        self.history = HistoryStore(history_db) if history_db else None
+        self.scanner = EventScanner(
+            addresses, self.run_on_connection, history=self.history, follow=events_follow
+        ) if scan_events else None
+        if self.scanner:
+            self.scanner.listeners.append(self.record_rewards)
+        self.events_wait = events_wait
+        self.held = []  # (deadline, address, balance, change, block number) waiting for the event scanner
+        self.last_balances = BalanceTable(addresses)
+        self.reward_stats = RewardStats()
+        self.last_block_number = None
+        self.listeners = []  # Called with a dict for every detected balance change
         self.lock = threading.Lock()
-        self.connect_to_node()
-        self.initialize_balances()
-        config = load_config()
+        self.pool.start()
+        notifications = self.notification_config
         self.notification_manager = NotificationManager(
-        discord_webhook=config["notifications"].get("discord_webhook"),
-        pushbullet_token=config["notifications"].get("pushbullet_token"),
-        pushover_user_key=config["notifications"].get("pushover", {}).get("user_key"),
-        pushover_app_token=config["notifications"].get("pushover", {}).get("app_token"),
-        telegram_bot_token=config["notifications"].get("telegram",{}).get('bot_token'),
-        telegram_chat_id=config["notifications"].get("telegram",{}).get('chat_id'),
+        discord_webhook=notifications.get("discord_webhook"),
+        pushbullet_token=notifications.get("pushbullet_token"),
+        pushover_user_key=notifications.get("pushover", {}).get("user_key"),
+        pushover_app_token=notifications.get("pushover", {}).get("api_token"),
+        telegram_bot_token=notifications.get("telegram",{}).get('bot_token'),
+        telegram_chat_id=notifications.get("telegram",{}).get('chat_id'),
+        timeout=notifications.get("timeout", 10),
+        max_retries=notifications.get("max_retries", 3),
     )
+        digest_window = notifications.get("digest_window", 0)
+        self.coalescer = NotificationCoalescer(
+            send_change=self.send_notification,
+            send_digest=self.send_digest,
+            window=digest_window,
+            immediate_change=to_planck(notifications.get("immediate_change")),
+            immediate_outgoing=to_planck(notifications.get("immediate_outgoing", 0)),
+        ) if digest_window else None
+        # Without the scanner a reward is guessed from the change: large ones are transfers
+        self.max_reward = to_planck(notifications.get("immediate_change") or 100)
         self.discord_webhook = discord_webhook
         self.pushbullet_token = pushbullet_token
         self.pushover_user_key = pushover_user_key
         self.pushover_app_token = pushover_app_token
         self.telegram_bot_token = telegram_bot_token
         self.telegram_chat_id = telegram_chat_id, telegram_bot_token
+        self.load_history()
+        self.initialize_balances()
         
         
-    def connect_to_node(self):
+    def run_on_connection(self, func, pinned=None):
         """
-        Connect to the blockchain node using substrate-interface.
+        Call func(substrate) on a pooled connection to the best healthy node, or to the
+        `pinned` endpoint. Blocking; meant for asyncio.to_thread. SubstrateInterface is
+        not thread-safe, so every in-flight call gets its own connection.
         """
-        try:
-            self.substrate = SubstrateInterface(
-                url=self.node_url,
-                # Specify the type registry preset or custom types if needed
+        return self.pool.run(func, pinned)
+
+    def close_connections(self):
+        """
+        Stop node health checks, close pooled connections and stop the shard processes.
+        """
+        self.pool.stop()
+        if self.shards:
+            self.shards.stop()
+
+    def load_history(self):
+        """
+        Warm last_balances from the history store, so monitoring can start without a
+        full scan. Changes made while we were not running are reported on the first check.
+        """
+        if not self.history:
+            return
+        self.reward_stats.load(self.history.reward_stats(), self.addresses)
+        stored = self.history.latest_balances()
+        with self.lock:
+            for address in self.addresses:
+                if address in stored:
+                    self.last_balances[address] = stored[address]
+        if stored:
+            logging.info(
+                f"Loaded {len(self.last_balances)} balances from history; changes since block "
+                f"#{self.history.checkpoint()} will be reported on the first check"
             )
-            logging.info("Successfully connected to the node")
-        except Exception as e:
-            logging.error(f"Failed to connect to node: {e}")
-            self.substrate = None
 
     def initialize_balances(self):
         """
-        Initialize the last_balances dictionary with the current balances.
+        Initialize the last_balances dictionary with the current balances of any
+        address not already loaded from history. Sharded, start the shard processes and
+        wait until each has sent its first balances.
         """
-        for address in self.addresses:
-            balance = self.get_balance(address)
-            with self.lock:
-                self.last_balances[address] = balance
+        if self.shards:
+            self.shards.start()
+            while not self.shards.started():
+                for block_number, balances in self.shards.receive():
+                    self.update_balances(balances, block_number)
+            return
+        with self.lock:
+            missing = [address for address in self.addresses if address not in self.last_balances]
+        if not missing:
+            return
+        def read_initial(substrate):
+            # Head and balances on one connection: another node may not have that block yet
+            block_hash, block_number = self.get_head(substrate)
+            return self.get_balances(missing, block_hash, substrate), block_number
 
-    def get_balance(self, address):
+        try:
+            balances, block_number = self.run_on_connection(read_initial)
+        except Exception as e:
+            logging.error(f"Failed to fetch initial balances: {e}")
+            return
+        self.update_balances(balances, block_number)
+
+    def get_head(self, substrate):
+        """
+        Hash and number of the current chain head.
         """
-        Retrieve the balance for a given address from the node.
+        with metrics.RPC_DURATION.time(call="chain_head"):
+            block_hash = substrate.get_chain_head()
+            return block_hash, substrate.get_block_number(block_hash)
+
+    def get_balance(self, address, block_hash=None, substrate=None):
         """
+        Retrieve the balance for a given address from the node, in the smallest unit.
+        """
+        if substrate is None:
+            return self.run_on_connection(lambda substrate: self.get_balance(address, block_hash, substrate))
         try:
-            result = self.substrate.query(
-                module='System',
-                storage_function='Account',
-                params=[address]
-            )
-            balance = result.value['data']['free']
-            # Convert balance from smallest unit to main unit (adjust exponent as needed)
-            balance_main_unit = balance / 10**18
-            return balance_main_unit
+            with metrics.RPC_DURATION.time(call="query"):
+                result = substrate.query(
+                    module='System',
+                    storage_function='Account',
+                    params=[address],
+                    block_hash=block_hash
+                )
+            return result.value['data']['free']
+        except CONNECTION_ERRORS:
+            raise
         except Exception as e:
             logging.error(f"Failed to get balance for address {address}: {e}")
             return None
 
-    def start_monitoring(self, stop_event):
+    def get_balances(self, addresses, block_hash=None, substrate=None):
+        """
+        Retrieve the balances for many addresses at once, all read at the same block.
+        Addresses are split into chunks of `batch_size` storage keys, each chunk being
+        a single state_queryStorageAt request. Falls back to get_balance per address
+        if the batched request fails.
+        """
+        if substrate is None:
+            return self.run_on_connection(lambda substrate: self.get_balances(addresses, block_hash, substrate))
+        if len(addresses) == 1 and not self.account_reader.keys:
+            return {addresses[0]: self.get_balance(addresses[0], block_hash, substrate)}
+
+        try:
+            if block_hash is None:
+                # Pin every chunk to the same block so a tick is a consistent snapshot
+                block_hash = substrate.get_chain_head()
+            return query_balances(substrate, addresses, block_hash, self.batch_size, self.account_reader)
+        except CONNECTION_ERRORS:
+            raise
+        except Exception as e:
+            logging.error(f"Batched balance query failed, querying addresses one by one: {e}")
+            return {address: self.get_balance(address, block_hash, substrate) for address in addresses}
+
+    async def fetch_all_balances(self, addresses=None):
+        """
+        Fetch every address (or only `addresses`) in `batch_size` chunks, with up to
+        `max_in_flight` chunks queried concurrently on separate connections. All chunks
+        are pinned to one block, read from the node that reported it as its head: a node
+        that is behind wouldn't have it. Returns the balances, the block number they were read
+        at and that node's endpoint.
+        """
+        if addresses is None:
+            addresses = self.addresses
+        endpoint = self.pool.best_endpoint()
+        with profiler.stage("monitor.chain_head"):
+            block_hash, block_number = await asyncio.to_thread(self.run_on_connection, self.get_head, endpoint)
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+
+        async def fetch_chunk(chunk):
+            async with semaphore:
+                try:
+                    return await asyncio.to_thread(
+                        self.run_on_connection,
+                        lambda substrate: self.get_balances(chunk, block_hash, substrate),
+                        endpoint
+                    )
+                except Exception as e:
+                    logging.error(f"Failed to fetch balances for {len(chunk)} addresses: {e}")
+                    return {}
+
+        chunks = [
+            addresses[start:start + self.batch_size]
+            for start in range(0, len(addresses), self.batch_size)
+        ]
+        balances = {}
+        with profiler.stage("monitor.fetch_balances"):
+            results = await asyncio.gather(*(fetch_chunk(chunk) for chunk in chunks))
+        for result in results:
+            balances.update(result)
+        return balances, block_number, endpoint
+
+    async def start_monitoring(self, stop_event):
         """
         Monitor the balances and send notifications if there are changes.
+        In "subscribe" mode the node pushes System.Account changes to us; if the
+        subscription drops we poll for `resubscribe_interval` seconds and try again.
         """
         logging.info("Starting balance monitoring...")
-        self.notification_manager.send_notification('\tStarting balance monitoring...')
+        self.notify('\tStarting balance monitoring...')
         while not stop_event.is_set():
-            for address in self.addresses:
-                balance = self.get_balance(address)
-                if balance is not None:
-                    with self.lock:
-                        last_balance = self.last_balances.get(address)
-                        if last_balance is not None and balance != last_balance:
-                            change = balance - last_balance
-                            formatted_balance = balance
-                            logging.info(f"Balance change detected for {truncate_address(address)}: {change:.4f} AI3")
-                            self.send_notification(address, formatted_balance, change)
-                        self.last_balances[address] = balance
-            time.sleep(self.check_interval)
-            
-            
-    def format_with_commas(self, incnumber):
-        number = float(incnumber)
-        try:
-            # If it's a float, format to include commas and maintain decimals
-            if isinstance(number, float):
-                return f"{number:,.4f}"  # Adjust decimal places if needed
-            # If it's an integer, format with commas
-            elif isinstance(number, int):
-                return f"{number:,}"
+            if self.shards:
+                await self.receive_shards(stop_event)
+            elif self.monitor_mode == "subscribe":
+                try:
+                    await asyncio.to_thread(self.subscribe_balances, stop_event)
+                except Exception as e:
+                    logging.error(f"Balance subscription dropped, falling back to polling: {e}")
+                await self.poll_balances(stop_event, duration=self.resubscribe_interval)
+            elif self.monitor_mode == "adaptive":
+                await self.poll_adaptive(stop_event)
             else:
-                raise ValueError("Input must be an int or float.")
+                await self.poll_balances(stop_event)
+
+    async def receive_shards(self, stop_event):
+        """
+        Apply the change records streamed by the shard processes as they arrive.
+        Shards poll (or subscribe) on their own; this only notifies and records.
+        """
+        while not stop_event.is_set():
+            records = await asyncio.to_thread(self.shards.receive)
+            for block_number, balances in records:
+                if block_number is None and (self.history or self.scanner):
+                    # Subscribing shards don't know the block
+                    block_number = await asyncio.to_thread(self.current_block_number)
+                if self.scanner and self.scanner.follow == "head" and block_number is not None:
+                    with profiler.stage("monitor.scan_events"):
+                        await self.scan_events(block_number)
+                with profiler.stage("monitor.update_balances"):
+                    self.update_balances(balances, block_number)
+
+    async def poll_balances(self, stop_event, duration=None):
+        """
+        Fetch all balances every `check_interval` seconds, optionally only for `duration` seconds.
+        """
+        deadline = time.time() + duration if duration is not None else None
+        next_tick = time.monotonic()
+        while not stop_event.is_set():
+            tick_start = time.monotonic()
+            # How late this tick started compared to when it was due (a busy loop or slow previous tick)
+            metrics.LOOP_LAG.set(max(0.0, tick_start - next_tick))
+            try:
+                with profiler.stage("monitor.tick"):
+                    balances, block_number, endpoint = await self.fetch_all_balances()
+                    if self.scanner and self.scanner.follow == "head":
+                        # Attribute events up to the same block first, so notifications carry the reason
+                        with profiler.stage("monitor.scan_events"):
+                            await self.scan_events(block_number, endpoint)
+                    with profiler.stage("monitor.update_balances"):
+                        self.update_balances(balances, block_number)
+            except Exception as e:
+                logging.error(f"Failed to fetch balances: {e}")
+            metrics.TICK_DURATION.observe(time.monotonic() - tick_start)
+            if deadline is not None and time.time() >= deadline:
+                return
+            next_tick = time.monotonic() + self.check_interval
+            await asyncio.sleep(self.check_interval)
+
+    async def poll_adaptive(self, stop_event):
+        """
+        Poll addresses on their own schedule (see PollScheduler): wallets that change often
+        are checked every `check_interval` seconds, idle ones back off up to `max_staleness`.
+        Each round fetches every due address, at most `batch_size * max_in_flight` at a time.
+        """
+        scheduler = PollScheduler(
+            self.addresses,
+            min_interval=self.check_interval,
+            max_staleness=self.max_staleness,
+            backoff=self.poll_backoff,
+        )
+        if self.rpc_limiter:
+            needed = len(self.addresses) / self.batch_size / self.max_staleness
+            if needed > self.rpc_limiter.rate:
+                logging.warning(
+                    f"max_rpc_per_second={self.rpc_limiter.rate} is too low to check {len(self.addresses)} "
+                    f"addresses every {self.max_staleness}s; some will be checked less often"
+                )
+        last_summary = time.monotonic()
+        while not stop_event.is_set():
+            wait = scheduler.next_due_in()
+            if wait:
+                await asyncio.sleep(min(wait, self.check_interval))
+                continue
+            # How late the most overdue address is being checked
+            metrics.LOOP_LAG.set(scheduler.overdue())
+            due = scheduler.pop_due(self.batch_size * self.max_in_flight, horizon=self.check_interval / 2)
+            tick_start = time.monotonic()
+            try:
+                with profiler.stage("monitor.tick"):
+                    balances, block_number, endpoint = await self.fetch_all_balances(due)
+                    if self.scanner and self.scanner.follow == "head":
+                        with profiler.stage("monitor.scan_events"):
+                            await self.scan_events(block_number, endpoint)
+                    with profiler.stage("monitor.update_balances"):
+                        changed = {address for address, balance in self.update_balances(balances, block_number)}
+            except Exception as e:
+                logging.error(f"Failed to fetch balances: {e}")
+                balances, changed = {}, set()
+            metrics.TICK_DURATION.observe(time.monotonic() - tick_start)
+            for address in due:
+                if balances.get(address) is None:
+                    scheduler.retry(address)
+                else:
+                    scheduler.record(address, address in changed)
+            if time.monotonic() - last_summary >= 600:
+                logging.info(f"Adaptive polling intervals: {scheduler.summary()}")
+                last_summary = time.monotonic()
+
+    async def scan_events(self, up_to=None, endpoint=None):
+        """
+        Run one incremental event scan in a worker thread, on `endpoint` if given (the
+        node that reported `up_to`).
+        """
+        try:
+            await asyncio.to_thread(self.scanner.scan, up_to, endpoint)
+        except Exception as e:
+            logging.error(f"Event scan failed: {e}")
+        self.release_held()
+
+    async def scan_events_loop(self, stop_event):
+        """
+        Keep the event scanner caught up when the poll loop doesn't drive it
+        (subscription mode, or when following finalized blocks). While a change waits for
+        its block to be scanned, scan every second instead of every `check_interval`.
+        """
+        next_scan = time.monotonic()
+        while not stop_event.is_set():
+            if self.held or time.monotonic() >= next_scan:
+                if self.monitor_mode == "subscribe" or self.scanner.follow != "head":
+                    await self.scan_events()
+                self.release_held()
+                next_scan = time.monotonic() + self.check_interval
+            await asyncio.sleep(1)
+
+    def subscribe_balances(self, stop_event):
+        """
+        Subscribe to System.Account storage of every address and handle changes as the
+        node pushes them (state_subscribeStorage). Blocks until the subscription drops
+        or stop_event is set. The subscription holds one pooled connection throughout.
+        """
+        self.run_on_connection(lambda substrate: self.subscribe_on_connection(substrate, stop_event))
+
+    def subscribe_on_connection(self, substrate, stop_event):
+        storage_keys = [
+            substrate.create_storage_key('System', 'Account', [address])
+            for address in self.addresses
+        ]
+        addresses_by_key = {storage_key.to_hex(): address for storage_key, address in zip(storage_keys, self.addresses)}
+
+        # The subscription only wakes up on storage changes, so close the socket on shutdown
+        subscription_done = threading.Event()
+        def close_on_stop():
+            while not subscription_done.is_set():
+                if stop_event.wait(1):
+                    substrate.close()
+                    return
+        threading.Thread(target=close_on_stop, daemon=True).start()
+
+        def subscription_handler(storage_key, updated_obj, update_nr, subscription_id):
+            if stop_event.is_set():
+                return True
+            address = addresses_by_key.get(storage_key.to_hex())
+            if address is None:
+                return None
+            with profiler.stage("monitor.subscription_update"):
+                value = updated_obj.value if updated_obj is not None else None
+                free = value['data']['free'] if value else 0
+                block_number = self.current_block_number() if self.history or self.scanner else None
+                self.update_balances({address: free}, block_number)
+            return None
+
+        logging.info(f"Subscribed to balance changes for {len(storage_keys)} addresses")
+        try:
+            substrate.subscribe_storage(storage_keys=storage_keys, subscription_handler=subscription_handler)
+        except CONNECTION_ERRORS:
+            # Closing the socket on shutdown ends the subscription with a connection error
+            if not stop_event.is_set():
+                raise
+        finally:
+            subscription_done.set()
+        if not stop_event.is_set():
+            raise ConnectionError("Storage subscription ended")
+
+    def current_block_number(self):
+        """
+        Number of the current chain head, or None if the node can't be reached.
+        """
+        try:
+            return self.run_on_connection(lambda substrate: substrate.get_block_number(None))
         except Exception as e:
-            raise ValueError(f"Error formatting number: {e}")
+            logging.error(f"Failed to get current block number: {e}")
+            return None
+
+    def update_balances(self, balances, block_number=None):
+        """
+        Compare freshly fetched balances (in the smallest unit) against last_balances in
+        one pass, notify on changes and record new balances in the history store. Returns
+        the (address, balance) pairs that differ from the cached balance.
+        """
+        with self.lock:
+            changes = self.last_balances.update(balances)
+            if block_number is not None:
+                self.last_block_number = block_number
+
+        changed = []
+        # Only changed addresses get formatted and notified
+        for address, last_balance, balance in changes:
+            changed.append((address, balance))
+            if last_balance is None:
+                continue
+            change = balance - last_balance
+            logging.info(f"Balance change detected for {truncate_address(address)}: {format_balance(change, signed=True)} AI3")
+            metrics.BALANCE_CHANGES.inc(address=address)
+            if not self.scanner and change < self.max_reward:
+                self.reward_stats.record(address, change)
+            self.dispatch_change(address, balance, change, block_number)
+            for listener in self.listeners:
+                listener({"address": address, "balance": balance, "change": change, "block_number": block_number})
+
+        if self.history and changed:
+            try:
+                self.history.record(changed, block_number)
+            except Exception as e:
+                logging.error(f"Failed to record balance history: {e}")
+        return changed
+
+    def record_rewards(self, records, block_times):
+        """
+        Count the block and vote rewards the event scanner attributed to our addresses, at
+        the time of their block, so rewards found while catching up land in the right buckets.
+        """
+        for address, block_number, reason, amount in records:
+            if reason in REWARD_REASONS:
+                self.reward_stats.record(address, amount, now=block_times.get(block_number))
+
+    def dispatch_change(self, address, balance, change, block_number=None):
+        """
+        Notify a change, through the coalescer if there is one. With the event scanner, a
+        change whose block hasn't been scanned yet is held until it is (at most
+        `events_wait` seconds), so the notification carries its own reasons.
+        """
+        if self.scanner and block_number is not None:
+            with self.lock:
+                # Behind an earlier held change of the same address, to keep them in order
+                wait = not self.scanner.reached(block_number) or any(held[1] == address for held in self.held)
+                if wait:
+                    self.held.append((time.monotonic() + self.events_wait, address, balance, change, block_number))
+            if wait:
+                return
+        self.deliver_change(address, balance, change, block_number)
+
+    def deliver_change(self, address, balance, change, block_number=None):
+        if self.coalescer:
+            self.coalescer.add(address, balance, change, block_number)
+        else:
+            self.send_notification(address, balance, change, block_number)
+
+    def release_held(self, everything=False):
+        """
+        Notify held changes whose block has been scanned or that waited `events_wait` seconds
+        (those go out without reasons), or all of them.
+        """
+        if not self.held:
+            return
+        now = time.monotonic()
+        ready, waiting, blocked = [], [], set()
+        with self.lock:
+            for held in self.held:
+                deadline, address, _, _, block_number = held
+                if address not in blocked and (everything or deadline <= now or self.scanner.reached(block_number)):
+                    ready.append(held)
+                else:
+                    blocked.add(address)
+                    waiting.append(held)
+            self.held = waiting
+        for _, address, balance, change, block_number in ready:
+            self.deliver_change(address, balance, change, block_number)
+
+    def save_reward_stats(self):
+        """
+        Keep the reward statistics in the history store, so a restart doesn't reset them.
+        """
+        if not self.history:
+            return
+        try:
+            self.history.save_reward_stats(self.reward_stats.state())
+        except Exception as e:
+            logging.error(f"Failed to save reward statistics: {e}")
+
+    def balance_snapshot(self):
+        """
+        Copy of the cached balances (in the smallest unit), for readers outside the monitor.
+        """
+        with self.lock:
+            return {"block_number": self.last_block_number, "balances": dict(self.last_balances.items())}
+            
+            
+    def format_with_commas(self, planck):
+        """
+        A balance in the smallest unit as AI3 with thousands separators, e.g. 1,234.5678.
+        """
+        return format_balance(planck)
         
     
-    def send_notification(self, address, balance, change):
+    def send_notification(self, address, balance, change, block_number=None):
         """
-        Send a notification about the balance change.
+        Send a notification about the balance change seen at `block_number`.
         """
         newbalance = self.format_with_commas(balance)
-        message = f"Balance change for {truncate_address(address)}: {change:+.4f} AI3 (New Balance: {newbalance} AI3)"
+        message = f"Balance change for {truncate_address(address)}: {format_balance(change, signed=True)} AI3 (New Balance: {newbalance} AI3)"
+        if self.scanner:
+            reasons = self.scanner.summarize(self.scanner.pop_reasons(address, block_number))
+            if reasons:
+                message += f" - {reasons}"
         
         logging.info(f"Sending notification: {message}")
-        self.notification_manager.send_notification(message)
+        self.notify(message)
 
-def fetch_gpu_stats(max_gpus=2):
-    """
-    Fetch NVIDIA-SMI stats for GPUs, displaying memory usage in GB,
-    temperatures, and utilization percentage.
-    Limit to `max_gpus` GPUs per update.
-    """
-    gpu_data = []
-    try:
-        if platform.system() == "Windows":
-            command = [
-                "nvidia-smi.exe",
-                "--query-gpu=index,name,memory.used,memory.total,temperature.gpu,utilization.gpu",
-                "--format=csv,noheader,nounits"
-            ]
-        else:
-            command = [
-                "nvidia-smi",
-                "--query-gpu=index,name,memory.used,memory.total,temperature.gpu,utilization.gpu",
-                "--format=csv,noheader,nounits"
-            ]
-
-        output = subprocess.check_output(command, text=True)
-        gpus = output.strip().split("\n")
-        for gpu in gpus:
-            gpu_info = gpu.split(", ")
-            if len(gpu_info) < 6:
-                continue  # Skip incomplete GPU info
-            index, name = gpu_info[0], gpu_info[1]
-            mem_used_mb = float(gpu_info[2])
-            mem_total_mb = float(gpu_info[3])
-            temp = gpu_info[4]
-            utilization = gpu_info[5]
-
-            mem_used_gb = mem_used_mb / 1024
-            mem_total_gb = mem_total_mb / 1024
-
-            # Truncate GPU name if necessary
-            truncated_name = name[:10] + '...' if len(name) > 13 else name # Remvoed from below
-
-            gpu_data.append(
-                f"GPU{index} {utilization}%: {mem_used_gb:.2f}/{mem_total_gb:.2f}GB {temp}°C"
+    def send_digest(self, entries):
+        """
+        Send one notification summarising several coalesced balance changes.
+        """
+        net_change = sum(entry["change"] for entry in entries)
+        rewards = sum(entry["rewards"] for entry in entries)
+        lines = [f"Balance digest: {format_balance(net_change, signed=True)} AI3 from {rewards} rewards across {len(entries)} wallets"]
+        for entry in entries:
+            newbalance = self.format_with_commas(entry["balance"])
+            line = (
+                f"{truncate_address(entry['address'])}: {format_balance(entry['change'], signed=True)} AI3 "
+                f"({entry['count']} changes, New Balance: {newbalance} AI3)"
             )
-    except subprocess.CalledProcessError as e:
-        logging.error(f"nvidia-smi command failed: {e}")
-        gpu_data.append("No GPU Data")
-    except FileNotFoundError:
-        logging.error("nvidia-smi not found. Ensure NVIDIA drivers are installed.")
-        gpu_data.append("No GPU Data")
-    except Exception as e:
-        logging.error(f"Failed to fetch GPU stats: {e}")
-        gpu_data.append("No GPU Data")
+            if self.scanner:
+                reasons = self.scanner.summarize(self.scanner.pop_reasons(entry["address"], entry["block_number"]))
+                if reasons:
+                    line += f" - {reasons}"
+            lines.append(line)
+        message = "\n".join(lines)
+
+        logging.info(f"Sending notification digest: {lines[0]}")
+        self.notify(message)
+
+    def notify(self, message):
+        """
+        Hand a message to the NotificationManager. Only queues it, so it never blocks the monitor.
+        """
+        with profiler.stage("notify.enqueue"):
+            self.notification_manager.send_notification(message)
+
+class ShardChecker(BalanceChecker):
+    def __init__(self, connection, **kwargs):
+        """
+        BalanceChecker for one shard of the addresses, in a process started by a
+        ShardCoordinator. Rather than notifying, it sends every balance that differs from
+        its own table to the coordinator over `connection`, one record per check.
+        """
+        self.connection = connection
+        super().__init__(**kwargs)
+        self.connection.send_bytes(READY)
+
+    def update_balances(self, balances, block_number=None):
+        with self.lock:
+            changes = self.last_balances.update(balances)
+            if changes:
+                ids = self.last_balances.ids
+                with profiler.stage("shard.send"):
+                    self.connection.send_bytes(
+                        encode_changes(block_number, [(ids[address], balance) for address, _, balance in changes])
+                    )
+        return [(address, balance) for address, _, balance in changes]
+
+    def notify(self, message):
+        pass  # The coordinator notifies
+
+    def send_stages(self):
+        stages = profiler.PROFILER.take_samples()
+        if stages:
+            with self.lock:
+                self.connection.send_bytes(encode_stages(stages))
+
+    async def upload_stages(self, stop_event):
+        while not stop_event.is_set():
+            await asyncio.sleep(STAGES_INTERVAL)
+            self.send_stages()
 
-    return gpu_data[:max_gpus]
+    async def run_until_stopped(self, stop_event):
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=self.max_in_flight + 4))
+        tasks = [asyncio.create_task(self.start_monitoring(stop_event))]
+        if profiler.PROFILER.enabled:
+            tasks.append(asyncio.create_task(self.upload_stages(stop_event)))
+        await asyncio.to_thread(wait_for_stop, self.connection, stop_event)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
-def fetch_system_stats():
+def run_shard(number, addresses, settings, connection):
     """
-    Fetch system statistics (CPU, memory).
+    Entry point of a shard process (see ShardCoordinator): watch `addresses` until the
+    coordinator says stop.
     """
+    # Ctrl+C reaches the whole process group; the coordinator decides when shards stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    settings = dict(settings)
+    logging.basicConfig(
+        level=settings.pop("log_level"),
+        format=f"%(asctime)s [%(levelname)s] [shard {number}] %(message)s"
+    )
+    if settings.pop("profile"):
+        profiler.PROFILER.enable()
+    checker = ShardChecker(connection, addresses=addresses, **settings)
+    if checker.metadata_cache:
+        logging.info(f"Started with {len(addresses)} addresses ({checker.metadata_cache.summary()})")
     try:
-        # CPU utilization
-        cpu_usage = psutil.cpu_percent(interval=1)
-
-        # Memory utilization
-        memory = psutil.virtual_memory()
-        total_memory_gb = memory.total / (1024 ** 3)
-        used_memory_gb = memory.used / (1024 ** 3)
-        memory_percent = memory.percent
-
-        return {
-            "cpu": f"CPU: {cpu_usage:.1f}%",
-            "mem": f"MEM: {used_memory_gb:.1f}/{total_memory_gb:.1f}GB ({memory_percent:.1f}%)",
-        }
-    except Exception as e:
-        logging.error(f"Failed to fetch system stats: {e}")
-        return {"cpu": "CPU: N/A", "mem": "MEM: N/A"}
+        asyncio.run(checker.run_until_stopped(threading.Event()))
+    finally:
+        checker.close_connections()
+        checker.send_stages()
+        connection.close()
 
-def update_status_bar(checker, config, status_file_path, stop_event):
+def export_metrics(checker, system_sampler, gpu_sampler=None):
     """
-    Write a dynamic status bar to a file for tmux to read.
+    Copy cached balances, node health and system/GPU samples into the metrics gauges.
+    Runs on every scrape, so it must never query the node or the GPU.
+    """
+    snapshot = checker.balance_snapshot()
+    for address, balance in snapshot["balances"].items():
+        if balance is not None:
+            metrics.BALANCE.set(balance / UNIT, address=address)
+    if snapshot["block_number"] is not None:
+        metrics.LAST_BLOCK.set(snapshot["block_number"])
+    checker.pool.export_metrics()
+
+    stats = system_sampler.stats()
+    if "cpu" in stats:
+        metrics.CPU_PERCENT.set(stats["cpu"]["last"], core="all")
+        for core, value in enumerate(stats.get("per_core", [])):
+            metrics.CPU_PERCENT.set(value, core=str(core))
+    if "mem_percent" in stats:
+        metrics.MEMORY_PERCENT.set(stats["mem_percent"]["last"])
+    for kind in ("disk_read", "disk_write", "net_sent", "net_recv"):
+        if kind in stats:
+            metrics.IO_RATE.set(stats[kind]["last"], kind=kind)
+
+    if gpu_sampler:
+        # Drop GPUs that disappeared (e.g. the driver went away)
+        for gauge in (metrics.GPU_UTILIZATION, metrics.GPU_MEMORY_USED, metrics.GPU_TEMPERATURE):
+            gauge.clear()
+        for sample in gpu_sampler.snapshot():
+            gpu = sample["index"]
+            metrics.GPU_MEMORY_USED.set(sample["mem_used_gb"] * 1024 ** 3, gpu=gpu)
+            try:
+                metrics.GPU_UTILIZATION.set(float(sample["utilization"]), gpu=gpu)
+                metrics.GPU_TEMPERATURE.set(float(sample["temp"]), gpu=gpu)
+            except ValueError:
+                pass  # "[N/A]" on some boards
+
+async def update_status_bar(checker, config, renderer, stop_event, system_sampler, gpu_sampler=None):
+    """
+    Write a dynamic status bar to every configured sink (e.g. a file for tmux to read).
     Rotate between wallet addresses and display system/GPU stats,
-    alternating CPU and MEM stats.
+    alternating CPU and MEM stats. Only reads cached data, never queries the node.
     """
     try:
         logging.info("Starting tmux status bar (Press Ctrl+C to stop)")
@@ -270,50 +859,166 @@ def update_status_bar(checker, config, status_file_path, stop_event):
                 with checker.lock:
                     balance = checker.last_balances.get(current_address)
 
-                if balance is None:
-                    balance = checker.get_balance(current_address)
-                    with checker.lock:
-                        checker.last_balances[current_address] = balance
-
                 truncated_address = truncate_address(current_address)
-                wallet_text = f"{truncated_address}: {balance:.4f} AI3" if balance is not None else "---- AI3"
+                balance_text = format_balance(balance, separator="") if balance is not None else "----"
+                wallet_text = f"{truncated_address}: {balance_text} AI3"
+
+                rewards_text = format_rewards(checker.reward_stats.stats(current_address))
+                portfolio_text = format_rewards(checker.reward_stats.stats())
 
-                # Fetch system stats
-                system_stats = fetch_system_stats()
+                with profiler.stage("status.system_stats"):
+                    system_stats = format_system_stats(system_sampler.stats())
                 sys_stat = system_stats["cpu"] if show_cpu else system_stats["mem"]
                 show_cpu = not show_cpu  # Toggle flag
 
-                # Determine terminal width
-                terminal_width = shutil.get_terminal_size().columns
-
-                # Determine how many GPUs to display
-                max_gpus = 2 if terminal_width < 120 else 3
-                gpu_stats = fetch_gpu_stats(max_gpus=max_gpus) if config.get("enable_gpu", True) else str()
-                gpu_text = " | ".join(gpu_stats) if gpu_stats else str()
+                with profiler.stage("status.gpu_lines"):
+                    gpu_lines = gpu_sampler.lines(max_gpus=3) if gpu_sampler else []
 
-                # Combine all stats into a single line
-                combined_status = f"{wallet_text} | {sys_stat} | {gpu_text}"
+                with profiler.stage("status.render"):
+                    renderer.render({
+                        "wallet": wallet_text,
+                        "address": truncated_address,
+                        "balance": balance_text,
+                        "rewards": rewards_text,
+                        "portfolio_rewards": portfolio_text,
+                        "system": sys_stat,
+                        "cpu": system_stats["cpu"],
+                        "mem": system_stats["mem"],
+                        "gpu_lines": gpu_lines,
+                    })
 
-                # Write the combined status to the file
-                with open(status_file_path, "w") as status_file:
-                    status_file.write(combined_status[:terminal_width] + "\n")  # Truncate if necessary
-
-                # Log the update for debugging
-                # logging.info(f"Updated status: {combined_status}")
-
-                # Update every 10 seconds
-                time.sleep(config.get("check_interval", 10))
+                await asyncio.sleep(config.get("status_interval", config.get("check_interval", 10)))
             except Exception as e:
                 logging.error(f"Error in status bar loop: {e}")
-                time.sleep(10)
+                await asyncio.sleep(10)
     except Exception as e:
         logging.error(f"Error initializing status bar: {e}")
 
+async def watch_rewards(checker, config, stop_event):
+    """
+    Check the reward alert rules (if `reward_alerts` is configured) and save the reward
+    statistics every few minutes. Reads only the rolling statistics, never the history.
+    """
+    rules = config.get("reward_alerts") or {}
+    alerts = RewardAlerts(
+        checker.reward_stats,
+        checker.notify,
+        truncate_address,
+        stall_factor=rules.get("stall_factor", 3),
+        rate_drop=rules.get("rate_drop", 30),
+        min_rewards=rules.get("min_rewards", 10),
+    ) if rules else None
+    interval = rules.get("check_interval", 60)
+    last_saved = time.monotonic()
+    while not stop_event.is_set():
+        await asyncio.sleep(interval)
+        if alerts:
+            try:
+                alerts.check()
+            except Exception as e:
+                logging.error(f"Reward alert check failed: {e}")
+        if time.monotonic() - last_saved >= 600:
+            await asyncio.to_thread(checker.save_reward_stats)
+            last_saved = time.monotonic()
+
+async def report_stage_timings(stop_event, interval):
+    """
+    Log per-stage timing percentiles every `interval` seconds (--profile).
+    """
+    while not stop_event.is_set():
+        await asyncio.sleep(interval)
+        profiler.PROFILER.log_report()
+
+async def run(checker, config, status_file_path, profile_output=None, profile_duration=60):
+    """
+    Run balance monitoring and the status bar as tasks on a single event loop.
+    Blocking node calls are handed to a shared thread pool, system and GPU stats come
+    from background samplers and notifications are delivered by the NotificationManager's
+    own per-channel workers.
+    """
+    # Event to signal worker threads (e.g. a blocking storage subscription) to stop
+    stop_event = threading.Event()
+
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=checker.max_in_flight + 4))
+    renderer = StatusRenderer(create_sinks(config.get("status_sinks"), status_file_path))
+    system_sampler = SystemSampler(
+        interval=config.get("system_sample_interval", 1),
+        window=config.get("system_stats_window", 60),
+    )
+    system_sampler.start()
+    gpu_sampler = None
+    if config.get("enable_gpu", True):
+        gpu_sampler = GpuSampler(interval_ms=config.get("gpu_sample_ms", 2000))
+        gpu_sampler.start()
+
+    query_server = None
+    if config.get("query_socket"):
+        query_server = QueryServer(config["query_socket"], {
+            "balances": checker.balance_snapshot,
+            "stats": system_sampler.snapshot,
+            "gpu": gpu_sampler.snapshot if gpu_sampler else list,
+            "rewards": checker.reward_stats.snapshot,
+        })
+        checker.listeners.append(query_server.publish)
+
+    metrics_server = None
+    if config.get("metrics_port"):
+        metrics.REGISTRY.on_scrape(lambda: export_metrics(checker, system_sampler, gpu_sampler))
+        metrics_server = metrics.start_metrics_server(config["metrics_port"], config.get("metrics_host", "127.0.0.1"))
+
+    capture = profiler.start_capture(profile_output, profile_duration, loop) if profile_output else None
+
+    try:
+        if query_server:
+            await query_server.start()
+        tasks = [
+            update_status_bar(checker, config, renderer, stop_event, system_sampler, gpu_sampler),
+            checker.start_monitoring(stop_event),
+            watch_rewards(checker, config, stop_event),
+        ]
+        if checker.scanner:
+            tasks.append(checker.scan_events_loop(stop_event))
+        if profiler.PROFILER.enabled:
+            tasks.append(report_stage_timings(stop_event, config.get("profile_interval", 60)))
+        await asyncio.gather(*tasks)
+    finally:
+        stop_event.set()
+        if capture:
+            capture.stop()
+        profiler.PROFILER.log_report()
+        if query_server:
+            await query_server.stop()
+        if metrics_server:
+            metrics_server.shutdown()
+        system_sampler.stop()
+        if gpu_sampler:
+            gpu_sampler.stop()
+        checker.close_connections()
+        checker.release_held(everything=True)
+        if checker.coalescer:
+            checker.coalescer.stop()
+        checker.notification_manager.stop()
+        if checker.history:
+            checker.save_reward_stats()
+            checker.history.close()
+
 def main():
     """
     Main function to initialize and start the BalanceChecker in the appropriate mode.
+    Usage: python WalletThingy.py [--profile] [--profile-output FILE] [--profile-duration SECONDS]
     """
+    parser = argparse.ArgumentParser(prog="WalletThingy.py", description="Monitor Autonomys wallet balances.")
+    parser.add_argument("--profile", action="store_true",
+                        help="Time each stage and log percentiles every profile_interval seconds and on exit")
+    parser.add_argument("--profile-output",
+                        help="Also profile into FILE: cProfile stats for *.prof, otherwise collapsed stacks for flamegraphs")
+    parser.add_argument("--profile-duration", type=float, default=60, help="Seconds to profile into --profile-output")
+    args = parser.parse_args()
+
     setup_logging()
+    if args.profile:
+        profiler.PROFILER.enable()
 
     # Load and validate configuration
     config = load_config()
@@ -324,6 +1029,8 @@ def main():
     addresses = config.get("addresses", [])
     check_interval = config.get("check_interval", 600)
     notification_config = config.get("notifications", {})
+    batch_size = config.get("batch_size", 500)
+    monitor_mode = config.get("monitor_mode", "poll")
     run_as_tmux = config.get("run_as_tmux", True)
 
     # Truncate addresses for logging
@@ -342,32 +1049,36 @@ def main():
         check_interval=check_interval,
         notification_config=notification_config,
         run_as_tmux=run_as_tmux,
+        batch_size=batch_size,
+        monitor_mode=monitor_mode,
+        resubscribe_interval=config.get("resubscribe_interval", 60),
+        max_in_flight=config.get("max_in_flight", 4),
+        health_check_interval=config.get("health_check_interval", 30),
+        reconnect_backoff_max=config.get("reconnect_backoff_max", 60),
+        history_db=config.get("history_db"),
+        scan_events=config.get("scan_events", False),
+        events_follow=config.get("events_follow", "head"),
+        events_wait=config.get("events_wait", 60),
+        max_staleness=config.get("max_staleness", 600),
+        poll_backoff=config.get("poll_backoff", 1.5),
+        max_rpc_per_second=config.get("max_rpc_per_second", 0),
+        metadata_cache=config.get("metadata_cache", DEFAULT_METADATA_CACHE),
+        shards=config.get("shards", 1),
+        shard_node_urls=config.get("shard_node_urls"),
     )
+    # Sharded, the shards use the metadata cache and log their own summary
+    cache = checker.metadata_cache if not checker.shards else None
+    logging.info(f"Ready in {time.monotonic() - STARTED_AT:.2f}s" + (f" ({cache.summary()})" if cache else ""))
 
         #if run_as_tmux:
     # Define the path for the status file that tmux will read
     status_file_path = "/tmp/tmux_status.txt"
 
-    # Event to signal threads to stop
-    stop_event = threading.Event()
-
-    # Create threads for the status bar and balance monitoring
-    status_bar_thread = threading.Thread(target=update_status_bar, args=(checker, config, status_file_path, stop_event))
-    monitoring_thread = threading.Thread(target=checker.start_monitoring, args=(stop_event,))
-
-    # Start the threads
-    status_bar_thread.start()
-    monitoring_thread.start()
-
     try:
-        while True:
-            time.sleep(1)
+        asyncio.run(run(checker, config, status_file_path, args.profile_output, args.profile_duration))
     except KeyboardInterrupt:
-        logging.info("Stopping all threads...")
-        stop_event.set()
-        status_bar_thread.join()
-        monitoring_thread.join()
-        logging.info("Exiting BalanceChecker. Goodbye!")
+        logging.info("Stopping all tasks...")
+    logging.info("Exiting BalanceChecker. Goodbye!")
 """ else:
         try:
             # Create a stop_event for consistency
@@ -376,5 +1087,100 @@ def main():
         except KeyboardInterrupt:
             logging.info("Exiting BalanceChecker. Goodbye!") """
 
+def backfill():
+    """
+    Rebuild balance and reward history for a block range into history_db.
+    Usage: python WalletThingy.py backfill --from N [--to M] [--step S] [--workers W] [--address A ...]
+    """
+    parser = argparse.ArgumentParser(prog="WalletThingy.py backfill", description=backfill.__doc__)
+    parser.add_argument("--from", dest="start_block", type=int, required=True, help="First block to backfill")
+    parser.add_argument("--to", dest="end_block", type=int, help="Last block (default: finalized head)")
+    parser.add_argument("--step", type=int, default=1, help="Sample the blocks divisible by STEP (events need 1)")
+    parser.add_argument("--workers", type=int, default=8, help="Parallel worker connections")
+    parser.add_argument("--segment-size", type=int, default=1000, help="Blocks per unit of work")
+    parser.add_argument("--address", action="append", help="Only backfill these addresses (default: all)")
+    args = parser.parse_args(sys.argv[2:])
+
+    setup_logging()
+    config = load_config()
+    validate_config(config)
+    if not config.get("history_db"):
+        logging.error("Error: backfill needs 'history_db' set in config.yaml.")
+        exit(1)
+
+    addresses = args.address or config.get("addresses", [])
+    batch_size = config.get("batch_size", 500)
+    history = HistoryStore(config["history_db"])
+    from modules.account_reader import AccountReader
+    connect, cache = node_connector(config.get("metadata_cache", DEFAULT_METADATA_CACHE))
+    pool = NodePool(
+        config["node_url"],
+        connect=connect,
+        health_check_interval=config.get("health_check_interval", 30),
+        backoff_max=config.get("reconnect_backoff_max", 60),
+    )
+    pool.start()
+    try:
+        end_block = args.end_block
+        if end_block is None:
+            end_block = pool.run(lambda substrate: substrate.get_block_number(substrate.get_chain_finalised_head()))
+
+        scanner = None
+        if config.get("scan_events", False):
+            if args.step == 1:
+                scanner = EventScanner(config.get("addresses", []), pool.run)
+                scanner.index = pool.run(scanner.build_index)
+            else:
+                logging.warning("Skipping event attribution: it needs every block (--step 1)")
+
+        reader = AccountReader(addresses, cache=cache)
+        Backfill(
+            pool,
+            fetch_balances=lambda substrate, chunk, block_hash, spec=None: query_balances(
+                substrate, chunk, block_hash, batch_size, reader, spec
+            ),
+            spec_version=reader.spec_version if reader.keys else None,
+            history=history,
+            addresses=addresses,
+            start_block=args.start_block,
+            end_block=end_block,
+            step=args.step,
+            workers=args.workers,
+            segment_size=args.segment_size,
+            scanner=scanner,
+        ).run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.stop()
+        history.close()
+
+def query():
+    """
+    Ask a running WalletThingy for cached data over its query socket.
+    Usage: python WalletThingy.py query [balances|stats|gpu|rewards|all|watch] [--socket PATH]
+    """
+    parser = argparse.ArgumentParser(prog="WalletThingy.py query", description=query.__doc__)
+    parser.add_argument("command", nargs="?", default="balances", help="balances, stats, gpu, rewards, all or watch")
+    parser.add_argument("--socket", help="Socket path (default: query_socket from config.yaml)")
+    args = parser.parse_args(sys.argv[2:])
+
+    path = args.socket or load_config().get("query_socket")
+    if not path:
+        print("No query socket configured; set 'query_socket' in config.yaml or pass --socket.")
+        exit(1)
+    try:
+        query_socket(path, args.command)
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f"WalletThingy is not running (no socket at {path}).")
+        exit(1)
+    except KeyboardInterrupt:
+        pass
+
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) > 1 and sys.argv[1] == "backfill":
+        backfill()
+    elif len(sys.argv) > 1 and sys.argv[1] == "query":
+        query()
+    else:
+        main()
@@ -0,0 +1,95 @@
+"""
+Write the runtime metadata fixture used by bench/mock_node.py.
+
+By default this builds a minimal V14 metadata with only what WalletThingy needs
+(System.Account, System.Number and the SS58Prefix constant), so no node is required.
+With --from-node the metadata of a real node is captured instead.
+
+Usage: python bench/make_metadata.py [--from-node ws://NodeIP:NodePort] [--output FILE]
+"""
+import argparse
+import os
+
+from scalecodec.base import RuntimeConfiguration
+from scalecodec.type_registry import load_type_registry_preset
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "metadata.hex")
+SS58_PREFIX = 6094  # Autonomys
+
+
+def primitive(name):
+    return {"path": [], "params": [], "def": {"primitive": name}, "docs": []}
+
+
+def composite(path, fields):
+    return {
+        "path": path,
+        "params": [],
+        "def": {"composite": {"fields": [
+            {"name": name, "type": type_id, "typeName": None, "docs": []} for name, type_id in fields
+        ]}},
+        "docs": [],
+    }
+
+
+def build_metadata():
+    """
+    SCALE-encoded MetadataV14 with the frame_system::AccountInfo layout of the real runtime.
+    """
+    types = [
+        primitive("u8"),                                                      # 0
+        {"path": [], "params": [], "def": {"array": {"len": 32, "type": 0}}, "docs": []},  # 1
+        composite(["sp_core", "crypto", "AccountId32"], [(None, 1)]),         # 2
+        primitive("u32"),                                                     # 3
+        primitive("u128"),                                                    # 4
+        composite(["pallet_balances", "types", "AccountData"],
+                  [("free", 4), ("reserved", 4), ("frozen", 4), ("flags", 4)]),  # 5
+        composite(["frame_system", "AccountInfo"],
+                  [("nonce", 3), ("consumers", 3), ("providers", 3), ("sufficients", 3), ("data", 5)]),  # 6
+        primitive("u16"),                                                     # 7
+        {"path": [], "params": [], "def": {"tuple": []}, "docs": []},         # 8
+    ]
+    system = {
+        "name": "System",
+        "storage": {"prefix": "System", "entries": [
+            {"name": "Account", "modifier": "Default", "documentation": [],
+             "type": {"Map": {"hashers": ["Blake2_128Concat"], "key": 2, "value": 6}}, "default": "0x" + "00" * 80},
+            {"name": "Number", "modifier": "Default", "documentation": [],
+             "type": {"Plain": 3}, "default": "0x00000000"},
+        ]},
+        "calls": None,
+        "event": None,
+        "constants": [{"name": "SS58Prefix", "type": 7, "value": "0x" + SS58_PREFIX.to_bytes(2, "little").hex(),
+                       "documentation": []}],
+        "error": None,
+        "index": 0,
+    }
+    runtime_config = RuntimeConfiguration()
+    runtime_config.update_type_registry(load_type_registry_preset("core"))
+    metadata = runtime_config.create_scale_object("MetadataVersioned")
+    return str(metadata.encode(("0x6d657461", {"V14": {
+        "types": {"types": [{"id": i, "type": t} for i, t in enumerate(types)]},
+        "pallets": [system],
+        "extrinsic": {"ty": 8, "version": 4, "signed_extensions": []},
+        "runtime_type": 8,
+    }})))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--from-node", help="Capture the metadata of this node instead of building a minimal one")
+    parser.add_argument("--output", default=FIXTURE, help="Where to write it (default: the mock node's fixture)")
+    args = parser.parse_args()
+    if args.from_node:
+        from substrateinterface import SubstrateInterface
+        metadata = SubstrateInterface(url=args.from_node).rpc_request("state_getMetadata", [])["result"]
+    else:
+        metadata = build_metadata()
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as fixture:
+        fixture.write(metadata + "\n")
+    print(f"Wrote {len(metadata) // 2 - 1} bytes of metadata to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+"""
+Stand-in Substrate node for benchmarks, using only the standard library.
+
+Speaks just enough JSON-RPC over websocket for SubstrateInterface and WalletThingy:
+runtime version and metadata (from fixtures/metadata.hex), headers and block hashes,
+state_queryStorageAt / state_getStorage and state_subscribeStorage for System.Account
+of N synthetic accounts. Blocks are produced every --block-time seconds, each changing
+the free balance of --changes-per-block random accounts. --latency-ms delays every
+response and --drop-every closes all connections periodically.
+
+The same port also accepts plain HTTP POSTs, so it doubles as the notification sink
+(point discord_webhook at http://host:port/discord). The "mock_stats" RPC method
+returns every balance change produced and every notification received, with timestamps.
+
+Usage: python bench/mock_node.py --accounts 1000 [--port 0] [--block-time 1]
+Prints one JSON line with the port and account public keys once listening.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import random
+import struct
+import sys
+import time
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "metadata.hex")
+ZERO_HASH = "0x" + "00" * 32
+# Storage key: twox128("System") + twox128("Account") + blake2_128(account) + account
+ACCOUNT_KEY_LENGTH = 16 + 16 + 16 + 32
+
+
+def block_hash(number):
+    return "0x" + hashlib.blake2b(number.to_bytes(8, "little"), digest_size=32).hexdigest()
+
+
+def encode_account_info(free, nonce=0):
+    """
+    SCALE-encode frame_system::AccountInfo: nonce, consumers, providers, sufficients (u32)
+    followed by AccountData free, reserved, frozen, flags (u128, as low/high u64 pairs).
+    """
+    return "0x" + struct.pack(
+        "<IIIIQQQQQQQQ", nonce, 0, 1, 0,
+        free & 0xFFFFFFFFFFFFFFFF, free >> 64, 0, 0, 0, 0, 0, 0,
+    ).hex()
+
+
+class MockChain:
+    def __init__(self, accounts, changes_per_block=1, seed=1, hot_accounts=0, hot_share=0.9):
+        self.random = random.Random(seed)
+        self.public_keys = [
+            hashlib.blake2b(f"account-{i}".encode(), digest_size=32).digest() for i in range(accounts)
+        ]
+        self.balances = {key: (i + 1) * 10**18 + self.random.randrange(10**18) for i, key in enumerate(self.public_keys)}
+        self.changes_per_block = changes_per_block
+        # Optionally a few "farming" accounts get most of the changes, like real reward wallets
+        self.hot_keys = self.public_keys[:hot_accounts]
+        self.hot_share = hot_share
+        self.number = 0
+        self.hashes = {block_hash(0): 0}
+        self.changes = []  # [public key hex, new free, block number, produced at]
+
+    @property
+    def head(self):
+        return block_hash(self.number)
+
+    def produce_block(self):
+        """
+        Advance one block and return the storage changes it made as {public key: new free}.
+        """
+        self.number += 1
+        self.hashes[self.head] = self.number
+        now = time.time()
+        changed = {}
+        keys = set()
+        while len(keys) < min(self.changes_per_block, len(self.public_keys)):
+            if self.hot_keys and self.random.random() < self.hot_share:
+                keys.add(self.random.choice(self.hot_keys))
+            else:
+                keys.add(self.random.choice(self.public_keys))
+        for key in keys:
+            self.balances[key] += self.random.randrange(10**15, 10**18)  # A reward-sized deposit
+            changed[key] = self.balances[key]
+            self.changes.append([key.hex(), self.balances[key], self.number, now])
+        return changed
+
+    def storage(self, storage_key):
+        data = bytes.fromhex(storage_key[2:])
+        if len(data) != ACCOUNT_KEY_LENGTH:
+            return None
+        free = self.balances.get(data[-32:])
+        return encode_account_info(free) if free is not None else None
+
+    def header(self, hash_):
+        number = self.hashes.get(hash_ or self.head)
+        if number is None:
+            return None
+        return {
+            "parentHash": block_hash(number - 1) if number else ZERO_HASH,
+            "number": hex(number),
+            "stateRoot": ZERO_HASH,
+            "extrinsicsRoot": ZERO_HASH,
+            "digest": {"logs": []},
+        }
+
+
+class MockNode:
+    def __init__(self, chain, metadata, block_time=1.0, latency=0.0, drop_every=0):
+        self.chain = chain
+        self.metadata = metadata
+        self.block_time = block_time
+        self.latency = latency
+        self.drop_every = drop_every
+        self.connections = set()
+        self.subscriptions = {}  # id -> (send, {account public key: storage key})
+        self.next_subscription = 1
+        self.notifications = []  # [received at, path, body]
+        self.requests = 0
+        self.drops = 0
+
+    async def produce_blocks(self):
+        while True:
+            await asyncio.sleep(self.block_time)
+            changed = self.chain.produce_block()
+            for subscription_id, (send, keys) in list(self.subscriptions.items()):
+                changes = [[keys[key], encode_account_info(free)] for key, free in changed.items() if key in keys]
+                if not changes:
+                    continue
+                try:
+                    await send({
+                        "jsonrpc": "2.0",
+                        "method": "state_storage",
+                        "params": {"subscription": subscription_id, "result": {"block": self.chain.head, "changes": changes}},
+                    })
+                except ConnectionError:
+                    self.subscriptions.pop(subscription_id, None)
+
+    async def drop_connections(self):
+        while True:
+            await asyncio.sleep(self.drop_every)
+            self.drops += 1
+            for writer in list(self.connections):
+                writer.close()
+
+    async def handle(self, reader, writer):
+        try:
+            request_line, headers = await read_request(reader)
+            if headers.get("upgrade", "").lower() == "websocket":
+                await self.handle_websocket(reader, writer, headers)
+            else:
+                await self.handle_http(reader, writer, request_line, headers)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections.discard(writer)
+            writer.close()
+
+    async def handle_http(self, reader, writer, request_line, headers):
+        """
+        Notification sink: accept any POST with 204, keeping the connection alive.
+        """
+        while request_line:
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+            parts = request_line.split()
+            self.notifications.append([time.time(), parts[1].decode() if len(parts) > 1 else "/", body.decode(errors="replace")])
+            writer.write(b"HTTP/1.1 204 No Content\r\nContent-Length: 0\r\n\r\n")
+            await writer.drain()
+            request_line, headers = await read_request(reader)
+
+    async def handle_websocket(self, reader, writer, headers):
+        accept = base64.b64encode(hashlib.sha1((headers["sec-websocket-key"] + WEBSOCKET_GUID).encode()).digest())
+        writer.write(
+            b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            b"Sec-WebSocket-Accept: " + accept + b"\r\n\r\n"
+        )
+        await writer.drain()
+        self.connections.add(writer)
+        lock = asyncio.Lock()
+
+        async def send(message):
+            async with lock:
+                writer.write(encode_frame(json.dumps(message).encode()))
+                await writer.drain()
+
+        owned = []
+        try:
+            while True:
+                opcode, payload = await read_frame(reader)
+                if opcode == 0x8:  # Close
+                    return
+                if opcode == 0x9:  # Ping
+                    async with lock:
+                        writer.write(encode_frame(payload, opcode=0xA))
+                    continue
+                if opcode not in (0x1, 0x2):
+                    continue
+                request = json.loads(payload)
+                self.requests += 1
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                result = self.call(request["method"], request.get("params") or [], send, owned)
+                await send({"jsonrpc": "2.0", "id": request["id"], "result": result})
+                if request["method"] == "state_subscribeStorage":
+                    # Like a real node, push the current values right after subscribing
+                    keys = self.subscriptions[result][1].values()
+                    await send({
+                        "jsonrpc": "2.0",
+                        "method": "state_storage",
+                        "params": {"subscription": result, "result": {
+                            "block": self.chain.head, "changes": [[key, self.chain.storage(key)] for key in keys],
+                        }},
+                    })
+        finally:
+            for subscription_id in owned:
+                self.subscriptions.pop(subscription_id, None)
+
+    def call(self, method, params, send, owned):
+        chain = self.chain
+        if method == "rpc_methods":
+            return {"methods": sorted(RPC_METHODS)}
+        if method == "system_name":
+            return "mock-node"
+        if method == "system_chain":
+            return "Mock Autonomys"
+        if method == "system_version":
+            return "0.0.0"
+        if method == "system_properties":
+            return {"ss58Format": 6094, "tokenDecimals": 18, "tokenSymbol": "AI3"}
+        if method == "system_health":
+            return {"peers": 1, "isSyncing": False, "shouldHavePeers": True}
+        if method in ("chain_getHead", "chain_getFinalizedHead", "chain_getFinalisedHead"):
+            return chain.head
+        if method == "chain_getBlockHash":
+            number = params[0] if params else None
+            if number is None:
+                return chain.head
+            return block_hash(number) if number <= chain.number else None
+        if method == "chain_getHeader":
+            return chain.header(params[0] if params else None)
+        if method in ("state_getRuntimeVersion", "chain_getRuntimeVersion"):
+            return {"specName": "mock", "implName": "mock", "authoringVersion": 0, "specVersion": 1,
+                    "implVersion": 0, "apis": [], "transactionVersion": 1, "stateVersion": 1}
+        if method == "state_getMetadata":
+            return self.metadata
+        if method in ("state_getStorage", "state_getStorageAt"):
+            return chain.storage(params[0])
+        if method == "state_queryStorageAt":
+            return [{"block": params[1] if len(params) > 1 and params[1] else chain.head,
+                     "changes": [[key, chain.storage(key)] for key in params[0]]}]
+        if method == "state_subscribeStorage":
+            subscription_id = f"sub-{self.next_subscription}"
+            self.next_subscription += 1
+            # Indexed by account public key (the last 32 bytes of each key) for block updates
+            self.subscriptions[subscription_id] = (send, {bytes.fromhex(key[-64:]): key for key in params[0]})
+            owned.append(subscription_id)
+            return subscription_id
+        if method == "state_unsubscribeStorage":
+            return self.subscriptions.pop(params[0], None) is not None
+        if method == "mock_stats":
+            return {
+                "changes": chain.changes,
+                "notifications": self.notifications,
+                "requests": self.requests,
+                "drops": self.drops,
+                "block": chain.number,
+            }
+        return None
+
+
+RPC_METHODS = {
+    "rpc_methods", "system_name", "system_chain", "system_version", "system_properties", "system_health",
+    "chain_getHead", "chain_getFinalizedHead", "chain_getFinalisedHead", "chain_getBlockHash", "chain_getHeader",
+    "state_getRuntimeVersion", "chain_getRuntimeVersion", "state_getMetadata", "state_getStorage",
+    "state_getStorageAt", "state_queryStorageAt", "state_subscribeStorage", "state_unsubscribeStorage",
+}
+
+
+async def read_request(reader):
+    """
+    Read an HTTP request line and headers. Returns (b"", {}) at end of stream.
+    """
+    request_line = await reader.readline()
+    headers = {}
+    while request_line:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode().partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return request_line, headers
+
+
+async def read_frame(reader):
+    """
+    Read one (possibly fragmented) client frame and return (opcode, unmasked payload).
+    """
+    payload = b""
+    opcode = None
+    while True:
+        first, second = await reader.readexactly(2)
+        opcode = opcode or first & 0x0F
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack(">H", await reader.readexactly(2))[0]
+        elif length == 127:
+            length = struct.unpack(">Q", await reader.readexactly(8))[0]
+        mask = await reader.readexactly(4) if second & 0x80 else None
+        data = await reader.readexactly(length)
+        if mask and length:
+            # XOR with the repeated mask as one big integer; much faster than per byte
+            mask = (mask * (length // 4 + 1))[:length]
+            data = (int.from_bytes(data, "big") ^ int.from_bytes(mask, "big")).to_bytes(length, "big")
+        payload += data
+        if first & 0x80:  # FIN
+            return opcode, payload
+
+
+def encode_frame(payload, opcode=0x1):
+    header = bytes([0x80 | opcode])
+    if len(payload) < 126:
+        header += bytes([len(payload)])
+    elif len(payload) < 65536:
+        header += bytes([126]) + struct.pack(">H", len(payload))
+    else:
+        header += bytes([127]) + struct.pack(">Q", len(payload))
+    return header + payload
+
+
+async def serve(args):
+    with open(args.metadata) as fixture:
+        metadata = fixture.read().strip()
+    chain = MockChain(args.accounts, args.changes_per_block, args.seed, args.hot_accounts, args.hot_share)
+    node = MockNode(chain, metadata, args.block_time, args.latency_ms / 1000, args.drop_every)
+    server = await asyncio.start_server(node.handle, args.host, args.port, limit=2 ** 24)
+    port = server.sockets[0].getsockname()[1]
+    print(json.dumps({"port": port, "public_keys": [key.hex() for key in chain.public_keys]}), flush=True)
+    background = [asyncio.create_task(node.produce_blocks())]
+    if args.drop_every:
+        background.append(asyncio.create_task(node.drop_connections()))
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in Substrate node for WalletThingy benchmarks")
+    parser.add_argument("--accounts", type=int, default=100, help="Number of synthetic accounts")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0, help="Port to listen on (default: any free port)")
+    parser.add_argument("--block-time", type=float, default=1.0, help="Seconds between blocks")
+    parser.add_argument("--changes-per-block", type=int, default=1, help="Accounts whose balance changes each block")
+    parser.add_argument("--hot-accounts", type=int, default=0, help="Accounts that receive most of the changes")
+    parser.add_argument("--hot-share", type=float, default=0.9, help="Share of changes that go to the hot accounts")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Delay added to every RPC response")
+    parser.add_argument("--drop-every", type=float, default=0, help="Close all connections every N seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--metadata", default=FIXTURE, help="File with the hex-encoded runtime metadata to serve")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,431 @@
+"""
+Benchmark WalletThingy against the local mock node (bench/mock_node.py).
+
+For each wallet count a fresh mock node and a fresh monitor process are started,
+the monitor runs for --duration seconds, and the following are measured:
+
+- tick duration (one balance check of every wallet), from the built-in stage timers
+- detection latency: block produced -> balance change seen by the monitor
+- notification latency: block produced -> notification received by the HTTP sink
+- throughput: wallet balances checked per second
+- resident memory and CPU time, in total and per wallet (shard processes included)
+- cold and warm start: launch of WalletThingy.py until it logs "Ready", first with an
+  empty runtime metadata cache and then with the cache the first start filled
+
+Results are printed as a table and written as JSON (--output). Pass --compare with an
+earlier results file to see the relative change of each metric.
+
+With --shards N the monitor splits the wallets across N processes; run it with
+--check-interval 0 to compare how many checks per second each shard count sustains.
+
+With --failover SECONDS a second, slower mock node of the same chain is started as a
+standby and the monitor gets both as node_url. The primary is killed after SECONDS;
+the run fails unless balance changes made on the standby afterwards are still detected.
+
+Usage: python bench/run_bench.py [--wallets 10 100 1000 10000] [--duration 30] [--output results.json]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+SS58_FORMAT = 6094
+STANDBY_LATENCY_MS = 20  # Added to the standby node, so the pool prefers the primary until it dies
+
+# Metrics where higher is worse, shown by --compare
+COMPARED = [
+    "tick_p50_ms", "tick_p90_ms", "detection_p50_ms", "detection_p90_ms", "notification_p50_ms",
+    "rss_mb", "cpu_percent", "cpu_us_per_wallet_tick", "startup_cold_s", "startup_warm_s",
+]
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+def start_mock_node(args, wallets, extra_latency_ms=0):
+    """
+    Start bench/mock_node.py and return (process, port, public keys).
+    """
+    command = [
+        sys.executable, os.path.join(BENCH_DIR, "mock_node.py"),
+        "--accounts", str(wallets),
+        "--block-time", str(args.block_time),
+        "--changes-per-block", str(args.changes_per_block),
+        "--hot-accounts", str(args.hot_accounts),
+        "--latency-ms", str(args.latency_ms + extra_latency_ms),
+        "--drop-every", str(args.drop_every),
+    ]
+    if args.metadata:
+        command += ["--metadata", args.metadata]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    ready = json.loads(process.stdout.readline())
+    return process, ready["port"], ready["public_keys"]
+
+
+def run_one(args, wallets):
+    """
+    Benchmark one wallet count: mock node and monitor each in their own process.
+    """
+    node, port, public_keys = start_mock_node(args, wallets)
+    standby = None
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            with open(os.path.join(workdir, "keys.json"), "w") as keys_file:
+                json.dump(public_keys, keys_file)
+            command = [
+                sys.executable, os.path.abspath(__file__), "--monitor",
+                "--port", str(port),
+                "--workdir", workdir,
+                "--duration", str(args.duration),
+                "--check-interval", str(args.check_interval),
+                "--monitor-mode", args.monitor_mode,
+                "--batch-size", str(args.batch_size),
+                "--max-in-flight", str(args.max_in_flight),
+                "--max-staleness", str(args.max_staleness),
+                "--max-rpc-per-second", str(args.max_rpc_per_second),
+                "--shards", str(args.shards),
+            ]
+            if args.failover:
+                # Same seed, so the same accounts and balances as the primary
+                standby, standby_port, _ = start_mock_node(args, wallets, STANDBY_LATENCY_MS)
+                command += ["--failover", str(args.failover), "--standby-port", str(standby_port), "--primary-pid", str(node.pid)]
+            output = subprocess.run(command, stdout=subprocess.PIPE, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            startup_port = standby_port if args.failover else port  # The primary is gone after a failover run
+            result.update(measure_startup(startup_port, public_keys, os.path.join(workdir, "startup"), args.shards))
+            return result
+    finally:
+        for process in (node, standby):
+            if process:
+                process.terminate()
+                process.wait()
+
+
+def measure_startup(port, public_keys, workdir, shards=1):
+    """
+    Start WalletThingy.py itself twice with the same metadata cache: cold (empty cache)
+    and warm. Returns the seconds from launch until each logged "Ready".
+    """
+    from scalecodec.utils.ss58 import ss58_encode
+
+    os.makedirs(workdir)
+    with open(os.path.join(workdir, "config.yaml"), "w") as config_file:
+        yaml.safe_dump({
+            "node_url": f"ws://127.0.0.1:{port}",
+            "addresses": [ss58_encode(key, SS58_FORMAT) for key in public_keys],
+            "enable_gpu": False,
+            "metadata_cache": os.path.join(workdir, "metadata"),
+            "shards": shards,
+        }, config_file)
+    result = {}
+    for name in ("startup_cold_s", "startup_warm_s"):
+        started = time.time()
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(REPO_DIR, "WalletThingy.py")],
+            cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+        )
+        try:
+            for line in process.stderr:
+                if "Ready in" in line:
+                    result[name] = round(time.time() - started, 3)
+                    break
+        finally:
+            process.terminate()
+            process.wait()
+    return result
+
+
+def monitor(args):
+    """
+    Run BalanceChecker in this process against the mock node and print the measurements as JSON.
+    """
+    import psutil
+    from scalecodec.utils.ss58 import ss58_encode
+
+    with open(os.path.join(args.workdir, "keys.json")) as keys_file:
+        public_keys = json.load(keys_file)
+    addresses = [ss58_encode(key, SS58_FORMAT) for key in public_keys]
+    node_url = f"ws://127.0.0.1:{args.port}"
+    # The node that runs until the end keeps the statistics and receives the notifications
+    stats_port = args.standby_port if args.failover else args.port
+    stats_url = f"ws://127.0.0.1:{stats_port}"
+    if args.failover:
+        node_url = [node_url, stats_url]
+    config = {
+        "node_url": node_url,
+        "addresses": addresses,
+        "check_interval": args.check_interval,
+        "monitor_mode": args.monitor_mode,
+        "batch_size": args.batch_size,
+        "max_in_flight": args.max_in_flight,
+        "max_staleness": args.max_staleness,
+        "max_rpc_per_second": args.max_rpc_per_second,
+        "shards": args.shards,
+        "enable_gpu": False,
+        "notifications": {"discord_webhook": f"http://127.0.0.1:{stats_port}/discord"},
+    }
+    os.chdir(args.workdir)
+    with open("config.yaml", "w") as config_file:
+        yaml.safe_dump(config, config_file)
+
+    sys.path.insert(0, REPO_DIR)
+    logging.basicConfig(level=logging.WARNING)
+    import WalletThingy
+    from modules import profiler
+    from modules.balance_table import format_balance
+    profiler.PROFILER.enable()
+
+    process = psutil.Process()
+    rss_before = process.memory_info().rss
+    start = time.time()
+    checker = WalletThingy.BalanceChecker(
+        node_url=node_url,
+        addresses=addresses,
+        check_interval=args.check_interval,
+        batch_size=args.batch_size,
+        monitor_mode=args.monitor_mode,
+        max_in_flight=args.max_in_flight,
+        max_staleness=args.max_staleness,
+        max_rpc_per_second=args.max_rpc_per_second,
+        notification_config=config["notifications"],
+        metadata_cache=os.path.join(args.workdir, "metadata"),
+        shards=args.shards,
+    )
+    startup_seconds = time.time() - start
+
+    detected = {}
+    checker.listeners.append(
+        lambda event: detected.setdefault((event["address"], event["balance"]), time.time())
+    )
+
+    measured = {}
+
+    def cpu_times():
+        # This process and its shard processes, {pid: seconds}
+        times = {}
+        for each in [process] + process.children(recursive=True):
+            try:
+                cpu = each.cpu_times()
+                times[each.pid] = cpu.user + cpu.system
+            except psutil.NoSuchProcess:
+                pass
+        return times
+
+    def rss():
+        total = 0
+        for each in [process] + process.children(recursive=True):
+            try:
+                total += each.memory_info().rss
+            except psutil.NoSuchProcess:
+                pass
+        return total
+
+    def kill_primary():
+        os.kill(args.primary_pid, signal.SIGKILL)
+        measured["killed_at"] = time.time()
+
+    async def run_for(duration):
+        task = asyncio.create_task(WalletThingy.run(checker, config, os.path.join(args.workdir, "status.txt")))
+        measured["start"], measured["cpu_before"] = time.time(), cpu_times()
+        if args.failover:
+            asyncio.get_running_loop().call_later(args.failover, kill_primary)
+        await asyncio.wait([task], timeout=duration)
+        # Measure before shutdown, which waits for queued notifications
+        measured["end"], measured["cpu_after"] = time.time(), cpu_times()
+        measured["rss"] = rss()
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(run_for(args.duration))
+    monitor_start = measured["start"]
+    elapsed = measured["end"] - monitor_start
+    cpu_before, cpu_after = measured["cpu_before"], measured["cpu_after"]
+    cpu_seconds = sum(seconds - cpu_before.get(pid, 0) for pid, seconds in cpu_after.items())
+    rss_bytes = measured["rss"]
+
+    from substrateinterface import SubstrateInterface
+    stats = SubstrateInterface(url=stats_url).rpc_request("mock_stats", [])["result"]
+
+    # Match produced changes to detections and notifications by address and new balance
+    address_by_key = dict(zip(public_keys, addresses))
+    detection, notification = [], []
+    produced = {}
+    changes = 0
+    killed_at = measured.get("killed_at")
+    after_kill, detected_after_kill = 0, []
+    for key, free, block, produced_at in stats["changes"]:
+        if produced_at < monitor_start or produced_at > monitor_start + elapsed - args.check_interval:
+            continue  # Before the monitor ran, or too late to be seen
+        changes += 1
+        address = address_by_key[key]
+        if (address, free) in detected:
+            detection.append(detected[(address, free)] - produced_at)
+        if killed_at is not None and produced_at > killed_at:
+            after_kill += 1
+            if detected.get((address, free), 0) > killed_at:
+                detected_after_kill.append(detected[(address, free)])
+        produced[(WalletThingy.truncate_address(address), format_balance(free))] = produced_at
+    for received_at, path, body in stats["notifications"]:
+        message = json.loads(body).get("content", "")
+        if "(New Balance: " not in message:
+            continue
+        truncated = message.split("Balance change for ", 1)[1].split(":", 1)[0]
+        balance = message.split("(New Balance: ", 1)[1].split(" AI3", 1)[0]
+        if (truncated, balance) in produced:
+            notification.append(received_at - produced[(truncated, balance)])
+
+    # With shards, tick timings come from every shard and each tick covers one shard
+    tick = profiler.PROFILER.report().get("monitor.tick", {})
+    ticks = tick.get("count", 0)
+    wallet_checks = ticks * len(addresses) / args.shards
+
+    def ms(value):
+        return round(value * 1000, 3) if value is not None else None
+
+    failover = {}
+    if args.failover:
+        failover = {
+            "failover_changes": after_kill,
+            "failover_detected": len(detected_after_kill),
+            # From killing the primary to the first change read from the standby
+            "failover_s": round(min(detected_after_kill) - killed_at, 3) if detected_after_kill else None,
+        }
+    print(json.dumps({
+        "wallets": len(addresses),
+        "monitor_mode": args.monitor_mode,
+        "shards": args.shards,
+        "duration_s": round(elapsed, 3),
+        "startup_s": round(startup_seconds, 3),
+        "ticks": ticks,
+        "tick_p50_ms": ms(tick.get("p50")),
+        "tick_p90_ms": ms(tick.get("p90")),
+        "tick_max_ms": ms(tick.get("max")),
+        "checks_per_s": round(wallet_checks / elapsed, 1),
+        "changes": changes,
+        "detected": len(detection),
+        "detection_p50_ms": ms(percentile(detection, 0.5)),
+        "detection_p90_ms": ms(percentile(detection, 0.9)),
+        "detection_max_ms": ms(max(detection) if detection else None),
+        "notifications": len(notification),
+        "notification_p50_ms": ms(percentile(notification, 0.5)),
+        "notification_p90_ms": ms(percentile(notification, 0.9)),
+        "rss_mb": round(rss_bytes / 2**20, 2),
+        "rss_kb_per_wallet": round((rss_bytes - rss_before) / 1024 / len(addresses), 3),
+        "cpu_seconds": round(cpu_seconds, 3),
+        "cpu_percent": round(100 * cpu_seconds / elapsed, 2),
+        "cpu_us_per_wallet_tick": round(1e6 * cpu_seconds / wallet_checks, 3) if ticks else None,
+        "rpc_requests": stats["requests"],
+        "connection_drops": stats["drops"],
+        **failover,
+    }))
+
+
+def print_table(results):
+    columns = [
+        ("wallets", "wallets"), ("shards", "shards"), ("ticks", "ticks"), ("tick_p50_ms", "tick p50 ms"),
+        ("tick_p90_ms", "tick p90 ms"), ("checks_per_s", "checks/s"),
+        ("detection_p50_ms", "detect p50 ms"), ("notification_p50_ms", "notify p50 ms"),
+        ("rss_mb", "RSS MB"), ("cpu_percent", "CPU %"), ("cpu_us_per_wallet_tick", "CPU us/wallet/tick"),
+        ("startup_cold_s", "cold start s"), ("startup_warm_s", "warm start s"),
+    ]
+    if any("failover_s" in result for result in results):
+        columns.append(("failover_s", "failover s"))
+    print("  ".join(f"{title:>14}" for _, title in columns))
+    for result in results:
+        print("  ".join(f"{'-' if result.get(key) is None else result[key]:>14}" for key, _ in columns))
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as baseline_file:
+        baseline = {r["wallets"]: r for r in json.load(baseline_file)["results"]}
+    print(f"\nChange against {baseline_path} (positive is slower / bigger):")
+    for result in results:
+        old = baseline.get(result["wallets"])
+        if not old:
+            continue
+        changes = []
+        for key in COMPARED:
+            if result.get(key) is not None and old.get(key):
+                changes.append(f"{key} {100 * (result[key] - old[key]) / old[key]:+.1f}%")
+        print(f"{result['wallets']:>7} wallets: " + ", ".join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark WalletThingy against a local mock node")
+    parser.add_argument("--wallets", type=int, nargs="+", default=[10, 100, 1000, 10000], help="Wallet counts to run")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to monitor per wallet count")
+    parser.add_argument("--block-time", type=float, default=1.0, help="Seconds between mock blocks")
+    parser.add_argument("--changes-per-block", type=int, default=1, help="Balances changed per mock block")
+    parser.add_argument("--hot-accounts", type=int, default=0, help="Wallets that get 90%% of the balance changes")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Latency added to every node response")
+    parser.add_argument("--drop-every", type=float, default=0, help="Drop node connections every N seconds")
+    parser.add_argument("--check-interval", type=float, default=1.0, help="Monitor check_interval")
+    parser.add_argument("--monitor-mode", default="poll", choices=["poll", "subscribe", "adaptive"])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--max-in-flight", type=int, default=4)
+    parser.add_argument("--max-staleness", type=float, default=600, help="Adaptive mode: longest gap between checks")
+    parser.add_argument("--max-rpc-per-second", type=float, default=0, help="RPC budget (0: unlimited)")
+    parser.add_argument("--shards", type=int, default=1, help="Monitor processes to split the wallets across")
+    parser.add_argument("--failover", type=float, default=0,
+                        help="Add a standby node and kill the primary after this many seconds (0: one node)")
+    parser.add_argument("--metadata", help="Runtime metadata for the mock node (see bench/make_metadata.py --output)")
+    parser.add_argument("--output", default="bench_results.json", help="Where to write the JSON results")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    # Internal: run the monitor side of one benchmark in this process
+    parser.add_argument("--monitor", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    parser.add_argument("--standby-port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--primary-pid", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.monitor:
+        monitor(args)
+        return
+
+    results = []
+    for wallets in args.wallets:
+        print(f"Benchmarking {wallets} wallets for {args.duration:.0f}s...", file=sys.stderr, flush=True)
+        results.append(run_one(args, wallets))
+    print_table(results)
+    failed = [result["wallets"] for result in results if args.failover and not result.get("failover_detected")]
+    if failed:
+        print(f"\nFailover FAILED for {failed} wallets: no change made on the standby node was detected", file=sys.stderr)
+
+    settings = {key: value for key, value in vars(args).items() if key not in ("monitor", "port", "workdir", "output", "compare")}
+    with open(args.output, "w") as output:
+        json.dump({
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "settings": settings,
+            "results": results,
+        }, output, indent=2)
+    print(f"\nWrote {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
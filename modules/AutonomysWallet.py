@@ -1,8 +1,8 @@
 import time
 from substrateinterface import SubstrateInterface
-from decimal import Decimal
 import logging
 from modules.notifications import NotificationManager
+from modules.balance_table import format_balance
 
 
 
@@ -49,14 +49,13 @@ class BalanceChecker:
     def get_balance(self, address):
         
         """
-        Retrieve the balance for a specific wallet address.
+        Retrieve the balance for a specific wallet address, in the smallest unit.
         """
         try:
             result = self.substrate.query('System', 'Account', [address])
             free_balance = result['data']['free'].value
-            balance_decimal = round(Decimal(free_balance) / Decimal(10**18), 5)
-            logging.debug(f"Balance for {self.truncate_address(address)}: {balance_decimal}")
-            return balance_decimal
+            logging.debug(f"Balance for {self.truncate_address(address)}: {format_balance(free_balance, places=5)}")
+            return free_balance
         except Exception as e:
             logging.error(f"Error retrieving balance for {self.truncate_address(address)}: {e}")
             return None
@@ -81,10 +80,10 @@ class BalanceChecker:
 
             # Notify only if balance has changed (not first cycle)
             if previous_balance is not None and current_balance != previous_balance:
-                change = round(current_balance - previous_balance, 3)
+                change = current_balance - previous_balance
                 message = (
                     f"Balance change detected for {self.truncate_address(address)}:\n"
-                    f"Change: {current_balance} ({'+' if change > 0 else '-'} {change} AI3)\n"
+                    f"Change: {format_balance(current_balance, places=5)} ({format_balance(change, places=3, signed=True)} AI3)\n"
                 )
             
                 logging.info(message)
@@ -113,7 +112,7 @@ class BalanceChecker:
                 for address in self.addresses:
                     balance = self.get_balance(address)
                     if balance is not None:
-                        status_line.append(f"{self.truncate_address(address)}: {balance:.6f}")
+                        status_line.append(f"{self.truncate_address(address)}: {format_balance(balance, places=6, separator='')}")
                 print(" | ".join(status_line), flush=True)
                 time.sleep(self.check_interval)
             except KeyboardInterrupt:
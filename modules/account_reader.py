@@ -0,0 +1,161 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from scalecodec.base import ScaleBytes
+from scalecodec.utils.ss58 import ss58_decode
+
+from modules import metrics
+from modules.node_pool import CONNECTION_ERRORS
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+# frame_system::AccountInfo: nonce, consumers, providers, sufficients (u32 each),
+# then AccountData: free, reserved, frozen, flags (u128 each). `free` is bytes 16..32.
+FREE_OFFSET = 16
+FREE_END = 32
+SPEC_CACHE_SIZE = 256  # Block hashes whose runtime version is remembered
+
+
+def decode_free(data):
+    """
+    `free` from a hex-encoded AccountInfo, in the chain's smallest unit.
+    """
+    return int.from_bytes(bytes.fromhex(data[2 + 2 * FREE_OFFSET:2 + 2 * FREE_END]), "little")
+
+
+def twox128(data):
+    return (
+        xxhash.xxh64(data, seed=0).intdigest().to_bytes(8, "little")
+        + xxhash.xxh64(data, seed=1).intdigest().to_bytes(8, "little")
+    )
+
+
+def account_storage_key(address):
+    """
+    Storage key of System.Account for `address`: twox128(pallet) + twox128(item) + blake2_128concat(account).
+    """
+    public_key = bytes.fromhex(ss58_decode(address).removeprefix("0x"))
+    return "0x" + (
+        twox128(b"System") + twox128(b"Account")
+        + hashlib.blake2b(public_key, digest_size=16).digest() + public_key
+    ).hex()
+
+
+class AccountReader:
+    def __init__(self, addresses, cache=None):
+        """
+        Read free balances with precomputed storage keys and raw state_queryStorageAt
+        results, slicing `free` straight out of the AccountInfo bytes instead of building
+        keys and running the SCALE decoder for every address on every check.
+        The layout is verified against the generic decoder once per runtime (spec)
+        version; query() returns None when the fast path can't be used, so callers
+        fall back to substrate.query_multi. With a MetadataCache, a successful check is
+        remembered across restarts, so a warm start needs no metadata at all.
+        """
+        self.keys = {}
+        self.cache = cache
+        if xxhash is None:
+            logging.info("xxhash not installed, using the generic balance decoder")
+            return
+        for address in addresses:
+            try:
+                self.keys[address] = account_storage_key(address)
+            except Exception as e:
+                logging.error(f"Can't precompute storage key for {address}: {e}")
+        self.verified = {}  # spec version -> fast path usable
+        self.spec_by_block = OrderedDict()  # block hash -> spec version, least recently used first
+        self.genesis_hash = None
+        self.lock = threading.Lock()
+
+    def spec_version(self, substrate, block_hash):
+        # All chunks of one check share a block hash, and backfill workers each revisit
+        # their own blocks, so a small LRU keeps this to about one request per block
+        if block_hash is not None:
+            with self.lock:
+                spec = self.spec_by_block.get(block_hash)
+                if spec is not None:
+                    self.spec_by_block.move_to_end(block_hash)
+                    return spec
+        with metrics.RPC_DURATION.time(call="runtime_version"):
+            spec = substrate.get_block_runtime_version(block_hash)["specVersion"]
+        if block_hash is not None:
+            with self.lock:
+                self.spec_by_block[block_hash] = spec
+                if len(self.spec_by_block) > SPEC_CACHE_SIZE:
+                    self.spec_by_block.popitem(last=False)
+        return spec
+
+    def query(self, substrate, addresses, block_hash, batch_size=500, spec=None):
+        """
+        Free balance (in the smallest unit) of every address at `block_hash`, or None to use
+        the generic decoder. Pass `spec` when the block's runtime version is already known.
+        """
+        if not self.keys or any(address not in self.keys for address in addresses):
+            return None
+        if spec is None:
+            spec = self.spec_version(substrate, block_hash)
+        if spec not in self.verified and self.cache:
+            if self.genesis_hash is None:
+                self.genesis_hash = substrate.get_block_hash(0)
+            if self.cache.facts(self.genesis_hash, spec).get("fast_balance_decoding"):
+                self.verified[spec] = True
+        if self.verified.get(spec) is False:
+            return None
+
+        raw = {}
+        for start in range(0, len(addresses), batch_size):
+            keys = [self.keys[address] for address in addresses[start:start + batch_size]]
+            # Same label as the generic decoder's batch read, so the metric covers both paths
+            with metrics.RPC_DURATION.time(call="query_multi"):
+                response = substrate.rpc_request("state_queryStorageAt", [keys, block_hash])
+            if "error" in response:
+                raise ValueError(response["error"].get("message"))
+            for group in response["result"]:
+                for key, data in group["changes"]:
+                    raw[key] = data
+
+        if spec not in self.verified:
+            self.verified[spec] = self.verify(substrate, addresses, raw, block_hash, spec)
+            if not self.verified[spec]:
+                return None
+            if self.cache:
+                # Only successes are remembered, so a failed check is tried again after a restart
+                self.cache.remember(self.genesis_hash, spec, fast_balance_decoding=True)
+
+        balances = {}
+        for address in addresses:
+            data = raw.get(self.keys[address])
+            balances[address] = decode_free(data) if data else 0
+        return balances
+
+    def verify(self, substrate, addresses, raw, block_hash, spec):
+        """
+        Check the precomputed key and byte offsets against the generic decoder for one
+        account (one that exists, if any) in the runtime `spec`. Connection errors are
+        raised rather than counted as a failed check.
+        """
+        sample = next((a for a in addresses if raw.get(self.keys[a])), addresses[0])
+        try:
+            substrate.init_runtime(block_hash=block_hash)
+            storage_key = substrate.create_storage_key("System", "Account", [sample])
+            if storage_key.to_hex() != self.keys[sample]:
+                raise ValueError("storage key differs")
+            data = raw.get(self.keys[sample])
+            if data:
+                expected = storage_key.decode_scale_value(ScaleBytes(data)).value["data"]["free"]
+                actual = decode_free(data)
+                if expected != actual:
+                    raise ValueError(f"decoded free balance {actual} != {expected}")
+        except CONNECTION_ERRORS:
+            # Says nothing about the layout; leave the runtime unverified so the next read checks again
+            raise
+        except Exception as e:
+            logging.warning(f"Fast balance decoding disabled for runtime version {spec}: {e}")
+            return False
+        logging.info(f"Using fast balance decoding for runtime version {spec}")
+        return True
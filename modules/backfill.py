@@ -0,0 +1,176 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class Backfill:
+    def __init__(self, pool, fetch_balances, history, addresses, start_block, end_block, step=1,
+                 workers=4, segment_size=1000, scanner=None, progress_interval=10, spec_version=None):
+        """
+        Rebuild balance history for `addresses` over [start_block, end_block], sampling the
+        blocks divisible by `step`. The range is cut into segments on a fixed grid of
+        `segment_size` blocks, so overlapping runs share segments, and processed by `workers`
+        threads, each on its own pooled connection.
+        `fetch_balances(substrate, addresses, block_hash, spec)` reads the balances at one
+        block; with `spec_version(substrate, block_hash)`, a segment within one runtime
+        version passes it as `spec` (otherwise None), so it isn't looked up for every block.
+        Finished segments are recorded per address in the history store, so an interrupted
+        run resumes where it stopped and a re-run only fills gaps.
+        """
+        self.pool = pool
+        self.fetch_balances = fetch_balances
+        self.history = history
+        self.addresses = addresses
+        self.start_block = start_block
+        self.end_block = end_block
+        self.step = step
+        self.workers = workers
+        # Keep segment boundaries on the sampling grid
+        self.segment_size = -(-segment_size // step) * step
+        self.scanner = scanner
+        self.progress_interval = progress_interval
+        self.spec_version = spec_version
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.blocks_done = 0
+
+    def plan(self):
+        """
+        List (start, end, addresses) for every segment not yet backfilled for all addresses.
+        Segments are grid cells clipped to the range; one is done for an address if a stored
+        segment covers it (the first and last cell of an earlier run may be partial).
+        """
+        completed = {}
+        for address, start, end in self.history.completed_segments(self.step):
+            completed.setdefault(address, []).append((start, end))
+        segments = []
+        grid_start = self.start_block // self.segment_size * self.segment_size
+        for cell in range(grid_start, self.end_block + 1, self.segment_size):
+            start = max(cell, self.start_block)
+            end = min(cell + self.segment_size - 1, self.end_block)
+            missing = [
+                address for address in self.addresses
+                if not any(first <= start and end <= last for first, last in completed.get(address, ()))
+            ]
+            if missing:
+                segments.append((start, end, missing))
+        return segments
+
+    def samples(self, start, end):
+        """
+        The sampled blocks in [start, end]: those divisible by `step`, the same for every run.
+        """
+        return range(-(-start // self.step) * self.step, end + 1, self.step)
+
+    def run(self):
+        """
+        Backfill all missing segments, logging progress and throughput. Blocking.
+        """
+        segments = self.plan()
+        total_blocks = sum(len(self.samples(start, end)) for start, end, _ in segments)
+        if not segments:
+            logging.info("Backfill: nothing to do, history already covers this range")
+            return
+        logging.info(
+            f"Backfill: {len(segments)} segments, {total_blocks} blocks to sample "
+            f"with {self.workers} workers"
+        )
+
+        started = time.time()
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        pending = {executor.submit(self.run_segment, *segment): segment for segment in segments}
+        failed = 0
+        try:
+            while pending:
+                done, _ = wait(pending, timeout=self.progress_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    start, end, _ = pending.pop(future)
+                    try:
+                        future.result()
+                    except Exception as e:
+                        failed += 1
+                        logging.error(f"Backfill of blocks #{start}-#{end} failed, rerun to fill the gap: {e}")
+                self.log_progress(started, total_blocks)
+        except KeyboardInterrupt:
+            logging.info("Backfill interrupted; finished segments are saved, rerun to resume")
+            self.stop_event.set()
+            raise
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        elapsed = time.time() - started
+        logging.info(
+            f"Backfill finished: {self.blocks_done} blocks in {elapsed:.0f}s "
+            f"({self.blocks_done / max(elapsed, 1e-9):.1f} blocks/s), {failed} segments failed"
+        )
+
+    def log_progress(self, started, total_blocks):
+        elapsed = time.time() - started
+        with self.lock:
+            done = self.blocks_done
+        rate = done / max(elapsed, 1e-9)
+        eta = (total_blocks - done) / rate if rate else float("inf")
+        logging.info(f"Backfill: {done}/{total_blocks} blocks, {rate:.1f} blocks/s, ETA {eta:.0f}s")
+
+    def run_segment(self, start, end, addresses):
+        return self.pool.run(lambda substrate: self.scan_segment(substrate, start, end, addresses))
+
+    def scan_segment(self, substrate, start, end, addresses):
+        """
+        Sample one segment and store every balance change in it in a single transaction.
+        The segment is only marked complete if it was scanned to the end.
+        """
+        rows, events = [], []
+        address_set = set(addresses)
+        samples = self.samples(start, end)
+        previous = self.balances_before(substrate, samples.start, addresses)
+        spec = self.segment_spec(substrate, start, end)
+        for block_number in samples:
+            if self.stop_event.is_set():
+                return
+            block_hash = self.block_hash(substrate, block_number)
+            for address, free in self.fetch_balances(substrate, addresses, block_hash, spec).items():
+                if previous.get(address) != free:
+                    rows.append((address, block_number, free))
+                    previous[address] = free
+            if self.scanner:
+                events.extend(
+                    record for record in self.scanner.attribute(block_number, substrate.get_events(block_hash))
+                    if record[0] in address_set
+                )
+            with self.lock:
+                self.blocks_done += 1
+
+        self.history.record_backfill(rows, events, [(address, start, end, self.step) for address in addresses])
+
+    def segment_spec(self, substrate, start, end):
+        """
+        The runtime version of every block in [start, end] if it is the same at both ends
+        (versions only go up), otherwise None.
+        """
+        if self.spec_version is None:
+            return None
+        first = self.spec_version(substrate, self.block_hash(substrate, start))
+        last = self.spec_version(substrate, self.block_hash(substrate, end))
+        return first if first == last else None
+
+    def balances_before(self, substrate, first, addresses):
+        """
+        Balances just before a segment's `first` sample, so it only gets a row if something
+        changed: read at the previous sample when that is in the range (its segment may
+        not be written yet), otherwise the last stored row before it.
+        """
+        if first - self.step >= self.start_block:
+            return self.fetch_balances(substrate, addresses, self.block_hash(substrate, first - self.step))
+        return self.history.balances_before(addresses, first)
+
+    def block_hash(self, substrate, block_number):
+        """
+        Hash of `block_number`. Raises instead of returning None, which the node would
+        otherwise answer as a query on its best block.
+        """
+        block_hash = substrate.get_block_hash(block_number)
+        if block_hash is None:
+            raise ValueError(f"block #{block_number} not found, it is past the node's best block")
+        return block_hash
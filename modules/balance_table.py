@@ -0,0 +1,155 @@
+import functools
+from decimal import Decimal
+
+DECIMALS = 18
+UNIT = 10**DECIMALS  # Smallest units per AI3
+WIDTH = 16  # Bytes per balance (u128)
+VECTORIZE_MIN = 128  # Smaller diffs are faster as a plain loop
+
+
+def to_planck(amount):
+    """
+    An amount in AI3 (e.g. a threshold from config.yaml) in the smallest unit. None stays None.
+    """
+    if amount is None:
+        return None
+    # Through str() so 0.1 means 0.1 AI3, not the nearest binary float
+    return int(Decimal(str(amount)) * UNIT)
+
+
+def format_balance(planck, places=4, signed=False, separator=","):
+    """
+    Exact decimal text in AI3 for an amount in the smallest unit, rounded half up to
+    `places` decimals. A non-zero amount that would round to zero keeps all of its
+    significant decimals, so a tiny reward never shows up as 0.0000.
+    """
+    sign = "-" if planck < 0 else "+" if signed else ""
+    magnitude = abs(planck)
+    scale = 10**(DECIMALS - places)
+    rounded = (magnitude + scale // 2) // scale
+    if magnitude and not rounded:
+        return f"{sign}0.{str(magnitude).zfill(DECIMALS).rstrip('0')}"
+    whole, fraction = divmod(rounded, 10**places)
+    text = f"{whole:,}".replace(",", separator)
+    if places:
+        text += f".{fraction:0{places}d}"
+    return sign + text
+
+
+@functools.cache
+def load_numpy():
+    """
+    NumPy, or None if it isn't installed. Imported on first use, as it takes ~0.1s.
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+class BalanceTable:
+    def __init__(self, addresses=()):
+        """
+        Latest free balance of every address in the smallest unit, kept exactly in a
+        compact array indexed by address id: 16 little-endian bytes per address (the u128
+        as the chain stores it) plus a byte for whether it is known yet. update() diffs a
+        whole tick against the table in one vectorized pass (NumPy, when installed and
+        the tick is large) and only hands back the addresses that changed. Reads work
+        like a dict.
+        """
+        self.ids = {}
+        self.addresses = []
+        self.values = bytearray()
+        self.known = bytearray()
+        for address in addresses:
+            self.add(address)
+
+    def add(self, address):
+        index = self.ids.get(address)
+        if index is None:
+            index = self.ids[address] = len(self.addresses)
+            self.addresses.append(address)
+            self.values.extend(bytes(WIDTH))
+            self.known.append(0)
+        return index
+
+    def value(self, index):
+        return int.from_bytes(self.values[index * WIDTH:(index + 1) * WIDTH], "little")
+
+    def get(self, address, default=None):
+        index = self.ids.get(address)
+        if index is None or not self.known[index]:
+            return default
+        return self.value(index)
+
+    def __getitem__(self, address):
+        balance = self.get(address)
+        if balance is None:
+            raise KeyError(address)
+        return balance
+
+    def __setitem__(self, address, balance):
+        index = self.add(address)
+        self.values[index * WIDTH:(index + 1) * WIDTH] = balance.to_bytes(WIDTH, "little")
+        self.known[index] = 1
+
+    def __contains__(self, address):
+        index = self.ids.get(address)
+        return index is not None and bool(self.known[index])
+
+    def __len__(self):
+        return self.known.count(1)
+
+    def items(self):
+        """
+        (address, balance) for every address with a known balance.
+        """
+        return [(address, self.value(index)) for index, address in enumerate(self.addresses) if self.known[index]]
+
+    def update(self, balances):
+        """
+        Store one tick of {address: balance} results (None means the address wasn't read)
+        and return (address, previous, balance) for every address whose balance differs
+        from the table, with `previous` None the first time an address is seen.
+        """
+        ids, packed = [], []
+        get = self.ids.get
+        for address, balance in balances.items():
+            if balance is not None:
+                index = get(address)
+                ids.append(self.add(address) if index is None else index)
+                packed.append(balance.to_bytes(WIDTH, "little"))
+        if not ids:
+            return []
+
+        changes = []
+        for i in self.diff(ids, packed):
+            index = ids[i]
+            previous = self.value(index) if self.known[index] else None
+            self.values[index * WIDTH:(index + 1) * WIDTH] = packed[i]
+            self.known[index] = 1
+            changes.append((self.addresses[index], previous, int.from_bytes(packed[i], "little")))
+        return changes
+
+    def diff(self, ids, packed):
+        """
+        Positions in `ids` whose packed balance differs from the table or isn't known yet.
+        """
+        if not any(self.known):
+            return range(len(ids))  # First fill at startup: everything is new
+        numpy = load_numpy() if len(ids) >= VECTORIZE_MIN else None
+        if numpy is None:
+            values, known = self.values, self.known
+            return [
+                i for i, index in enumerate(ids)
+                if not known[index] or values[index * WIDTH:(index + 1) * WIDTH] != packed[i]
+            ]
+        # Zero-copy views of the table; they must not outlive this call, or add() can't grow it
+        index = numpy.fromiter(ids, dtype=numpy.intp, count=len(ids))
+        table = numpy.frombuffer(self.values, dtype=numpy.uint64).reshape(-1, 2)
+        fresh = numpy.frombuffer(b"".join(packed), dtype=numpy.uint64).reshape(-1, 2)
+        mask = table[index, 0] != fresh[:, 0]
+        mask |= table[index, 1] != fresh[:, 1]
+        mask |= numpy.frombuffer(self.known, dtype=numpy.uint8)[index] == 0
+        return numpy.flatnonzero(mask).tolist()
@@ -0,0 +1,101 @@
+import logging
+import threading
+import time
+
+
+class NotificationCoalescer:
+    def __init__(self, send_change, send_digest, window=60, immediate_change=None, immediate_outgoing=0):
+        """
+        Merge balance changes that arrive within `window` seconds into one digest.
+        `send_change(address, balance, change, block_number)` sends a single change right
+        away; `send_digest(entries)` sends the merged changes, one entry per address, with
+        the block of its latest change.
+        Incoming changes of at least `immediate_change` and outgoing changes of at least
+        `immediate_outgoing` (use 0 for every outgoing transfer) skip the window. Balances,
+        changes and thresholds are all in the smallest unit.
+        Set a threshold to None to always coalesce that kind of change.
+        """
+        self.send_change = send_change
+        self.send_digest = send_digest
+        self.window = window
+        self.immediate_change = immediate_change
+        self.immediate_outgoing = immediate_outgoing
+        self.pending = {}
+        self.flush_at = None
+        self.condition = threading.Condition()
+        self.stopped = False
+        self.thread = threading.Thread(target=self.run, name="notify-coalescer", daemon=True)
+        self.thread.start()
+
+    def is_immediate(self, change):
+        if change < 0:
+            return self.immediate_outgoing is not None and -change >= self.immediate_outgoing
+        return self.immediate_change is not None and change >= self.immediate_change
+
+    def add(self, address, balance, change, block_number=None):
+        """
+        Record a balance change seen at `block_number`, sending it straight away if it is large or outgoing.
+        """
+        if self.is_immediate(change):
+            with self.condition:
+                # Keep the digest's "New Balance" current for this address
+                if address in self.pending:
+                    self.pending[address]["balance"] = balance
+            self.send_change(address, balance, change, block_number)
+            return
+        with self.condition:
+            entry = self.pending.get(address)
+            if entry is None:
+                self.pending[address] = {"address": address, "change": change, "count": 1,
+                                         "rewards": 1 if change > 0 else 0, "balance": balance,
+                                         "block_number": block_number}
+            else:
+                entry["change"] += change
+                entry["count"] += 1
+                entry["rewards"] += 1 if change > 0 else 0
+                entry["balance"] = balance
+                entry["block_number"] = block_number
+            if self.flush_at is None:
+                self.flush_at = time.monotonic() + self.window
+                self.condition.notify()
+
+    def flush(self):
+        """
+        Send everything pending now. A lone change goes out as a regular notification.
+        """
+        with self.condition:
+            entries, self.pending = list(self.pending.values()), {}
+            self.flush_at = None
+        if len(entries) == 1 and entries[0]["count"] == 1:
+            entry = entries[0]
+            self.send_change(entry["address"], entry["balance"], entry["change"], entry["block_number"])
+        elif entries:
+            self.send_digest(entries)
+
+    def stop(self):
+        """
+        Flush pending changes and stop the flush thread.
+        """
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        self.thread.join()
+        self.flush()
+
+    def run(self):
+        with self.condition:
+            while not self.stopped:
+                if self.flush_at is None:
+                    self.condition.wait()
+                    continue
+                remaining = self.flush_at - time.monotonic()
+                if remaining > 0:
+                    self.condition.wait(remaining)
+                    continue
+                self.condition.release()
+                try:
+                    self.flush()
+                except Exception as e:
+                    logging.error(f"Failed to send notification digest: {e}")
+                finally:
+                    self.condition.acquire()
@@ -0,0 +1,143 @@
+import logging
+import platform
+import subprocess
+import threading
+import time
+
+from modules import profiler
+
+QUERY_FIELDS = "index,name,memory.used,memory.total,temperature.gpu,utilization.gpu"
+
+
+class GpuSampler:
+    def __init__(self, interval_ms=2000, restart_delay=30):
+        """
+        Keep the latest per-GPU sample in memory, refreshed by a long-lived sampler:
+        NVML bindings (pynvml) when installed, otherwise a single
+        `nvidia-smi --loop-ms` child whose CSV output is parsed line by line.
+        """
+        self.interval_ms = interval_ms
+        self.restart_delay = restart_delay
+        self.samples = {}
+        self.available = True
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.process = None
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="gpu-sampler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        process = self.process
+        if process and process.poll() is None:
+            process.terminate()
+
+    def lines(self, max_gpus=2):
+        """
+        Status bar text for up to `max_gpus` GPUs from the latest samples. Never blocks on the GPU.
+        """
+        with self.lock:
+            samples = [self.samples[index] for index in sorted(self.samples)]
+            available = self.available
+        if not samples:
+            return ["No GPU Data"] if not available else []
+        return [
+            f"GPU{s['index']} {s['utilization']}%: {s['mem_used_gb']:.2f}/{s['mem_total_gb']:.2f}GB {s['temp']}°C"
+            for s in samples[:max_gpus]
+        ]
+
+    def snapshot(self):
+        """
+        Copy of the latest sample of every GPU.
+        """
+        with self.lock:
+            return [dict(self.samples[index]) for index in sorted(self.samples)]
+
+    def update(self, index, name, mem_used_mb, mem_total_mb, temp, utilization):
+        with self.lock:
+            self.samples[index] = {
+                "index": index,
+                "name": name,
+                "mem_used_gb": mem_used_mb / 1024,
+                "mem_total_gb": mem_total_mb / 1024,
+                "temp": temp,
+                "utilization": utilization,
+                "sampled_at": time.time(),
+            }
+            self.available = True
+
+    def set_unavailable(self):
+        with self.lock:
+            self.samples = {}
+            self.available = False
+
+    def run(self):
+        try:
+            import pynvml
+            pynvml.nvmlInit()
+        except Exception:
+            pynvml = None
+
+        while not self.stop_event.is_set():
+            try:
+                if pynvml:
+                    self.run_nvml(pynvml)
+                else:
+                    self.run_nvidia_smi()
+            except FileNotFoundError:
+                logging.error("nvidia-smi not found. Ensure NVIDIA drivers are installed.")
+                self.set_unavailable()
+            except Exception as e:
+                logging.error(f"Failed to fetch GPU stats: {e}")
+                self.set_unavailable()
+            # Sampler died: try again later rather than hammering a broken driver
+            self.stop_event.wait(self.restart_delay)
+
+    def run_nvml(self, pynvml):
+        handles = [pynvml.nvmlDeviceGetHandleByIndex(i) for i in range(pynvml.nvmlDeviceGetCount())]
+        names = [pynvml.nvmlDeviceGetName(handle) for handle in handles]
+        while not self.stop_event.is_set():
+            with profiler.stage("sampler.nvml"):
+                for index, (handle, name) in enumerate(zip(handles, names)):
+                    memory = pynvml.nvmlDeviceGetMemoryInfo(handle)
+                    self.update(
+                        str(index),
+                        name.decode() if isinstance(name, bytes) else name,
+                        memory.used / 1024 ** 2,
+                        memory.total / 1024 ** 2,
+                        str(pynvml.nvmlDeviceGetTemperature(handle, pynvml.NVML_TEMPERATURE_GPU)),
+                        str(pynvml.nvmlDeviceGetUtilizationRates(handle).gpu),
+                    )
+            self.stop_event.wait(self.interval_ms / 1000)
+
+    def run_nvidia_smi(self):
+        """
+        Run one `nvidia-smi --loop-ms` child and parse each CSV line as it arrives.
+        """
+        command = [
+            "nvidia-smi.exe" if platform.system() == "Windows" else "nvidia-smi",
+            f"--query-gpu={QUERY_FIELDS}",
+            "--format=csv,noheader,nounits",
+            f"--loop-ms={self.interval_ms}",
+        ]
+        self.process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True, bufsize=1)
+        try:
+            for line in self.process.stdout:
+                gpu_info = line.strip().split(", ")
+                if len(gpu_info) < 6:
+                    continue  # Skip incomplete GPU info
+                try:
+                    with profiler.stage("sampler.nvidia_smi_parse"):
+                        self.update(gpu_info[0], gpu_info[1], float(gpu_info[2]), float(gpu_info[3]),
+                                    gpu_info[4], gpu_info[5])
+                except ValueError:
+                    continue  # e.g. "[N/A]" while the driver is busy
+        finally:
+            if self.process.poll() is None:
+                self.process.terminate()
+            returncode = self.process.wait()
+        if not self.stop_event.is_set():
+            raise RuntimeError(f"nvidia-smi exited with status {returncode}")
@@ -0,0 +1,226 @@
+import sqlite3
+import threading
+import time
+
+
+class HistoryStore:
+    def __init__(self, path):
+        """
+        Balance history in SQLite (WAL mode). `balances` keeps one row per change,
+        `latest` the current balance per address for a fast warm start. Balances and
+        amounts are exact integers in the smallest unit.
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        with self.db:
+            self.db.executescript("""
+                CREATE TABLE IF NOT EXISTS balances (
+                    address TEXT NOT NULL,
+                    block_number INTEGER,
+                    free TEXT NOT NULL,
+                    recorded_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS latest (
+                    address TEXT PRIMARY KEY,
+                    block_number INTEGER,
+                    free TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS events (
+                    address TEXT NOT NULL,
+                    block_number INTEGER NOT NULL,
+                    reason TEXT NOT NULL,
+                    amount TEXT
+                );
+                CREATE INDEX IF NOT EXISTS events_address_block ON events (address, block_number);
+                CREATE TABLE IF NOT EXISTS backfill_segments (
+                    address TEXT NOT NULL,
+                    start_block INTEGER NOT NULL,
+                    end_block INTEGER NOT NULL,
+                    step INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    name TEXT PRIMARY KEY,
+                    block_number INTEGER NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS reward_stats (
+                    address TEXT PRIMARY KEY,
+                    state BLOB NOT NULL
+                );
+            """)
+        self.unique_balance_rows()
+
+    def unique_balance_rows(self):
+        """
+        Allow one balances row per address and block, so a backfill over blocks that are
+        already stored can't duplicate them. Duplicates in an existing database are removed
+        (keeping the newest) before the unique index replaces the plain one.
+        """
+        if self.db.execute("SELECT 1 FROM sqlite_master WHERE name = 'balances_address_block_unique'").fetchone():
+            return
+        with self.db:
+            self.db.execute("""
+                DELETE FROM balances WHERE block_number IS NOT NULL AND rowid NOT IN (
+                    SELECT MAX(rowid) FROM balances WHERE block_number IS NOT NULL GROUP BY address, block_number
+                )
+            """)
+            self.db.execute("CREATE UNIQUE INDEX balances_address_block_unique ON balances (address, block_number)")
+            self.db.execute("DROP INDEX IF EXISTS balances_address_block")
+
+    def record(self, changes, block_number=None):
+        """
+        Store a list of (address, free) balance changes seen at `block_number` in one transaction.
+        A balance already stored for the address at that block (from a reorg) is replaced.
+        """
+        if not changes:
+            return
+        now = time.time()
+        with self.lock, self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO balances (address, block_number, free, recorded_at) VALUES (?, ?, ?, ?)",
+                [(address, block_number, str(free), now) for address, free in changes]
+            )
+            self.db.executemany(
+                "INSERT OR REPLACE INTO latest (address, block_number, free) VALUES (?, ?, ?)",
+                [(address, block_number, str(free)) for address, free in changes]
+            )
+            if block_number is not None:
+                self.set_checkpoint("balances", block_number)
+
+    def record_events(self, records, block_number):
+        """
+        Store (address, block_number, reason, amount) attributions and move the
+        "events" checkpoint to `block_number` in the same transaction.
+        """
+        with self.lock, self.db:
+            self.db.executemany(
+                "INSERT INTO events (address, block_number, reason, amount) VALUES (?, ?, ?, ?)",
+                [(address, block_number, reason, str(amount)) for address, block_number, reason, amount in records]
+            )
+            self.set_checkpoint("events", block_number)
+
+    def record_backfill(self, rows, events, segments):
+        """
+        Store historical (address, block_number, free) rows and event attributions, and
+        mark (address, start_block, end_block, step) segments complete, in one transaction.
+        Unlike record(), this leaves the latest balances and checkpoints alone, and keeps
+        balances already stored at a block.
+        """
+        now = time.time()
+        with self.lock, self.db:
+            self.db.executemany(
+                "INSERT OR IGNORE INTO balances (address, block_number, free, recorded_at) VALUES (?, ?, ?, ?)",
+                [(address, block_number, str(free), now) for address, block_number, free in rows]
+            )
+            self.db.executemany(
+                "INSERT INTO events (address, block_number, reason, amount) VALUES (?, ?, ?, ?)",
+                [(address, block_number, reason, str(amount)) for address, block_number, reason, amount in events]
+            )
+            self.db.executemany(
+                "INSERT INTO backfill_segments (address, start_block, end_block, step) VALUES (?, ?, ?, ?)",
+                segments
+            )
+
+    def completed_segments(self, step):
+        """
+        Set of (address, start_block, end_block) segments already backfilled with `step`.
+        """
+        with self.lock:
+            return set(self.db.execute(
+                "SELECT address, start_block, end_block FROM backfill_segments WHERE step = ?", (step,)
+            ))
+
+    def set_checkpoint(self, name, block_number):
+        """
+        Remember the last block processed by `name`. Call inside a transaction or on its own.
+        """
+        self.db.execute(
+            "INSERT OR REPLACE INTO checkpoints (name, block_number, updated_at) VALUES (?, ?, ?)",
+            (name, block_number, time.time())
+        )
+
+    def checkpoint(self, name="balances"):
+        """
+        Last block recorded by `name`, or None if there is none yet.
+        """
+        with self.lock:
+            row = self.db.execute("SELECT block_number FROM checkpoints WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def save_reward_stats(self, rows):
+        """
+        Replace the saved reward statistics with (address, state) rows from RewardStats.state().
+        """
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM reward_stats")
+            self.db.executemany("INSERT INTO reward_stats (address, state) VALUES (?, ?)", rows)
+
+    def reward_stats(self):
+        with self.lock:
+            return self.db.execute("SELECT address, state FROM reward_stats").fetchall()
+
+    def latest_balances(self):
+        """
+        The most recently recorded balance of every address.
+        """
+        with self.lock:
+            return {address: int(free) for address, free in self.db.execute("SELECT address, free FROM latest")}
+
+    def balances_before(self, addresses, block_number):
+        """
+        The last balance recorded before `block_number` for each of `addresses` that has one.
+        """
+        balances = {}
+        with self.lock:
+            for address in addresses:
+                row = self.db.execute(
+                    "SELECT free FROM balances WHERE address = ? AND block_number < ? "
+                    "ORDER BY block_number DESC, rowid DESC LIMIT 1",
+                    (address, block_number)
+                ).fetchone()
+                if row:
+                    balances[address] = int(row[0])
+        return balances
+
+    def history(self, address, start_block=None, end_block=None, batch_size=1000):
+        """
+        Yield (block_number, free, recorded_at) for `address` in block order, reading
+        `batch_size` rows at a time so memory stays bounded for long histories.
+        """
+        query = "SELECT block_number, free, recorded_at FROM balances WHERE address = ?"
+        for block_number, free, recorded_at in self.page(query, address, start_block, end_block, batch_size):
+            yield block_number, int(free), recorded_at
+
+    def events(self, address, start_block=None, end_block=None, batch_size=1000):
+        """
+        Yield (block_number, reason, amount) attributions for `address` in block order.
+        """
+        query = "SELECT block_number, reason, amount FROM events WHERE address = ?"
+        for block_number, reason, amount in self.page(query, address, start_block, end_block, batch_size):
+            yield block_number, reason, int(amount) if amount is not None else None
+
+    def page(self, query, address, start_block, end_block, batch_size):
+        params = [address]
+        if start_block is not None:
+            query += " AND block_number >= ?"
+            params.append(start_block)
+        if end_block is not None:
+            query += " AND block_number <= ?"
+            params.append(end_block)
+        query += " ORDER BY block_number, rowid"
+
+        with self.lock:
+            cursor = self.db.execute(query, params)
+        while True:
+            with self.lock:
+                rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield from rows
+
+    def close(self):
+        with self.lock:
+            self.db.close()
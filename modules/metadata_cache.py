@@ -0,0 +1,161 @@
+import json
+import logging
+import os
+import threading
+
+from scalecodec.base import ScaleBytes
+from substrateinterface import SubstrateInterface
+
+
+class MetadataCache:
+    def __init__(self, directory):
+        """
+        Runtime metadata on disk, one file per (genesis hash, spec version), so restarts
+        don't download it again. Next to it a small JSON file keeps facts learned about
+        that runtime (e.g. that fast balance decoding matches it) so they don't have to
+        be checked again, which would mean decoding the metadata. Shared by every
+        connection of the process; metadata read from disk is kept in memory.
+        """
+        self.directory = os.path.expanduser(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.memory = {}
+        self.hits = 0
+        self.misses = 0
+        self.facts_reused = 0
+
+    def path(self, genesis_hash, spec_version, suffix):
+        return os.path.join(self.directory, f"{genesis_hash.removeprefix('0x')}-{spec_version}.{suffix}")
+
+    def load(self, genesis_hash, spec_version):
+        """
+        Hex-encoded metadata of this runtime, or None if it isn't cached.
+        """
+        key = (genesis_hash, spec_version)
+        with self.lock:
+            data = self.memory.get(key)
+            if data is None:
+                try:
+                    with open(self.path(genesis_hash, spec_version, "metadata")) as file:
+                        data = file.read().strip() or None
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logging.warning(f"Can't read cached metadata for runtime {spec_version}: {e}")
+                if data:
+                    self.memory[key] = data
+            if data:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return data
+
+    def store(self, genesis_hash, spec_version, data):
+        with self.lock:
+            self.memory[(genesis_hash, spec_version)] = data
+        self.write(self.path(genesis_hash, spec_version, "metadata"), data)
+        logging.info(f"Cached runtime metadata for runtime version {spec_version} in {self.directory}")
+
+    def discard(self, genesis_hash, spec_version):
+        with self.lock:
+            self.memory.pop((genesis_hash, spec_version), None)
+            # The load that found it didn't really hit
+            self.hits -= 1
+            self.misses += 1
+        try:
+            os.remove(self.path(genesis_hash, spec_version, "metadata"))
+        except OSError:
+            pass
+
+    def facts(self, genesis_hash, spec_version):
+        """
+        What was remembered about this runtime, e.g. {"fast_balance_decoding": True}.
+        """
+        try:
+            with open(self.path(genesis_hash, spec_version, "json")) as file:
+                facts = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        if facts:
+            with self.lock:
+                self.facts_reused += 1
+        return facts
+
+    def remember(self, genesis_hash, spec_version, **facts):
+        with self.lock:
+            path = self.path(genesis_hash, spec_version, "json")
+            try:
+                with open(path) as file:
+                    facts = {**json.load(file), **facts}
+            except (OSError, ValueError):
+                pass
+            self.write(path, json.dumps(facts))
+
+    def write(self, path, text):
+        # Write then rename, so other processes sharing the directory never read half a file
+        temporary = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temporary, "w") as file:
+                file.write(text)
+            os.replace(temporary, path)
+        except OSError as e:
+            logging.warning(f"Can't write {path}: {e}")
+
+    def summary(self):
+        return (
+            f"runtime metadata: {self.hits} from cache, {self.misses} downloaded, "
+            f"{self.facts_reused} runtime checks reused"
+        )
+
+
+class CachedSubstrateInterface(SubstrateInterface):
+    def __init__(self, url, metadata_cache=None, rpc_limiter=None, **kwargs):
+        """
+        SubstrateInterface that takes runtime metadata from a MetadataCache when it holds
+        the node's runtime, and adds what it downloads otherwise. With a TokenBucket as
+        `rpc_limiter`, every request waits for its budget.
+        """
+        self.metadata_cache = metadata_cache
+        self.rpc_limiter = rpc_limiter
+        self.genesis_hash = None
+        # websocket-client checks every received frame for valid UTF-8 in pure Python,
+        # which costs more than the rest of a large balance query; node JSON is ASCII
+        kwargs["ws_options"] = {"skip_utf8_validation": True, **(kwargs.get("ws_options") or {})}
+        super().__init__(url=url, **kwargs)
+
+    def rpc_request(self, method, params, result_handler=None):
+        # Health probes don't count: their round trip is the node's latency measurement
+        if self.rpc_limiter and method != "system_health":
+            self.rpc_limiter.wait()
+        return super().rpc_request(method, params, result_handler)
+
+    def get_genesis_hash(self):
+        if self.genesis_hash is None:
+            self.genesis_hash = self.get_block_hash(0)
+        return self.genesis_hash
+
+    def get_block_metadata(self, block_hash=None, decode=True):
+        if self.metadata_cache is None or not decode:
+            return super().get_block_metadata(block_hash, decode)
+        genesis_hash = self.get_genesis_hash()
+        spec_version = self.get_block_runtime_version(block_hash)["specVersion"]
+
+        data = self.metadata_cache.load(genesis_hash, spec_version)
+        if data is not None:
+            try:
+                return self.decode_metadata(data)
+            except Exception as e:
+                logging.warning(f"Cached metadata for runtime version {spec_version} is unreadable, downloading it: {e}")
+                self.metadata_cache.discard(genesis_hash, spec_version)
+
+        response = super().get_block_metadata(block_hash, decode=False)
+        if not response.get("result"):
+            return response
+        metadata = self.decode_metadata(response["result"])
+        self.metadata_cache.store(genesis_hash, spec_version, response["result"])
+        return metadata
+
+    def decode_metadata(self, data):
+        metadata = self.runtime_config.create_scale_object("MetadataVersioned", data=ScaleBytes(data))
+        metadata.decode()
+        return metadata
@@ -0,0 +1,177 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def format_labels(labelnames, values):
+    if not labelnames:
+        return ""
+    pairs = []
+    for name, value in zip(labelnames, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def key(self, labels):
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def clear(self):
+        with self.lock:
+            self.values = {}
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self.key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, state in sorted(self.values.items()):
+                for bound, count in zip(self.buckets, state["counts"]):
+                    labels = format_labels(self.labelnames + ("le",), key + (bound,))
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = format_labels(self.labelnames + ("le",), key + ("+Inf",))
+                lines.append(f"{self.name}_bucket{labels} {state['count']}")
+                labels = format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {state['sum']}")
+                lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.scrape_callbacks = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def on_scrape(self, callback):
+        """
+        Run `callback` before each scrape, to copy cached values into gauges.
+        Callbacks must only read caches, never query the node.
+        """
+        self.scrape_callbacks.append(callback)
+
+    def exposition(self):
+        for callback in self.scrape_callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logging.error(f"Metrics scrape callback failed: {e}")
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+BALANCE = Gauge("wallet_balance_ai3", "Latest known free balance per address", ["address"])
+BALANCE_CHANGES = Counter("wallet_balance_changes_total", "Balance changes detected per address", ["address"])
+LAST_BLOCK = Gauge("wallet_last_checked_block", "Block number of the latest balance check")
+RPC_DURATION = Histogram("wallet_rpc_duration_seconds", "Node RPC latency", ["call"])
+NODE_CONNECTION_ERRORS = Counter("wallet_node_connection_errors_total", "Node connection failures", ["node"])
+NODE_HEALTHY = Gauge("wallet_node_healthy", "1 if the node endpoint is in rotation", ["node"])
+NODE_LATENCY = Gauge("wallet_node_latency_seconds", "Smoothed health-check latency", ["node"])
+TICK_DURATION = Histogram("wallet_monitor_tick_seconds", "Duration of one balance check of all addresses")
+LOOP_LAG = Gauge("wallet_monitor_loop_lag_seconds", "How late the latest balance check started")
+NOTIFICATION_DURATION = Histogram("wallet_notification_duration_seconds", "Notification request latency", ["channel"])
+NOTIFICATIONS_SENT = Counter("wallet_notifications_sent_total", "Notifications delivered", ["channel"])
+NOTIFICATION_FAILURES = Counter("wallet_notification_failures_total", "Notifications given up on", ["channel"])
+CPU_PERCENT = Gauge("wallet_system_cpu_percent", "CPU usage percent", ["core"])
+MEMORY_PERCENT = Gauge("wallet_system_memory_percent", "Memory usage, latest sample")
+IO_RATE = Gauge("wallet_system_io_bytes_per_second", "Disk and network throughput, latest sample", ["kind"])
+GPU_UTILIZATION = Gauge("wallet_gpu_utilization_percent", "GPU utilization", ["gpu"])
+GPU_MEMORY_USED = Gauge("wallet_gpu_memory_used_bytes", "GPU memory in use", ["gpu"])
+GPU_TEMPERATURE = Gauge("wallet_gpu_temperature_celsius", "GPU temperature", ["gpu"])
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.exposition().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Keep scrapes out of the log
+
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """
+    Serve /metrics for Prometheus in a background thread. Returns the server (call shutdown() to stop).
+    """
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logging.info(f"Metrics available at http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,249 @@
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from modules import metrics
+
+# Errors that mean the connection (not the query) is broken. The one definition: import it from here
+CONNECTION_ERRORS = (ConnectionError, OSError, TimeoutError)
+try:
+    from websocket import WebSocketException
+    CONNECTION_ERRORS += (WebSocketException,)
+except ImportError:
+    pass
+
+
+class NodeEndpoint:
+    def __init__(self, url):
+        self.url = url
+        self.latency = None  # Smoothed health-check round trip, in seconds
+        self.healthy = True
+        self.failures = 0
+        self.retry_at = 0.0
+        self.in_flight = 0
+        self.idle_connections = []
+
+    def score(self):
+        """
+        Lower is better: latency, weighted by how busy the endpoint already is.
+        """
+        latency = self.latency if self.latency is not None else 1.0
+        return latency * (1 + self.in_flight)
+
+
+class NodePool:
+    def __init__(self, urls, connect, health_check_interval=30, backoff_base=1, backoff_max=60):
+        """
+        Pool of node connections across one or more endpoints.
+        `connect(url)` must return a new connection object with close() and rpc_request().
+        """
+        if isinstance(urls, str):
+            urls = [urls]
+        self.endpoints = [NodeEndpoint(url) for url in urls]
+        self.connect = connect
+        self.health_check_interval = health_check_interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.health_thread = None
+
+    def start(self):
+        """
+        Probe every endpoint once, then keep probing in a background thread.
+        """
+        self.check_health()
+        self.health_thread = threading.Thread(target=self.health_loop, daemon=True)
+        self.health_thread.start()
+
+    def stop(self):
+        """
+        Stop health checks and close every idle connection.
+        """
+        self.stop_event.set()
+        for endpoint in self.endpoints:
+            with self.lock:
+                connections, endpoint.idle_connections = endpoint.idle_connections, []
+            self.close_all(connections)
+
+    def close_all(self, connections):
+        for substrate in connections:
+            try:
+                substrate.close()
+            except Exception as e:
+                logging.debug(f"Failed to close node connection: {e}")
+
+    def best_endpoint(self):
+        """
+        The endpoint acquire() would use now, for pinning several queries to one node
+        (e.g. every read of one block, which a node that is behind may not have yet).
+        """
+        with self.lock:
+            return self.select()
+
+    def select(self):
+        # Call with the lock held
+        now = time.time()
+        candidates = [e for e in self.endpoints if e.healthy or e.retry_at <= now]
+        if not candidates:
+            retry_in = min(e.retry_at for e in self.endpoints) - now
+            raise ConnectionError(f"No healthy node available (next retry in {retry_in:.1f}s)")
+        return min(candidates, key=lambda e: (not e.healthy, e.score()))
+
+    def pick_endpoint(self, pinned=None):
+        """
+        Choose the `pinned` endpoint, or the best healthy one or one whose reconnect
+        backoff has expired, and take one of its idle connections if it has any.
+        """
+        with self.lock:
+            endpoint = pinned or self.select()
+            if not endpoint.healthy and endpoint.retry_at > time.time():
+                raise ConnectionError(f"Node {endpoint.url} is unavailable (next retry in {endpoint.retry_at - time.time():.1f}s)")
+            endpoint.in_flight += 1
+            substrate = endpoint.idle_connections.pop() if endpoint.idle_connections else None
+        return endpoint, substrate
+
+    def acquire(self, pinned=None):
+        """
+        Return (endpoint, connection) on the `pinned` endpoint or the best available one,
+        opening a new connection if it has none idle. Endpoints that fail to connect are
+        backed off and, unless pinned, the next best one is tried.
+        """
+        last_error = None
+        for _ in range(1 if pinned else len(self.endpoints)):
+            endpoint, substrate = self.pick_endpoint(pinned)
+            if substrate is not None:
+                return endpoint, substrate
+            try:
+                return endpoint, self.connect(endpoint.url)
+            except Exception as e:
+                last_error = e
+                with self.lock:
+                    endpoint.in_flight -= 1
+                self.mark_failed(endpoint, e)
+        raise ConnectionError(f"Failed to connect to any node: {last_error}")
+
+    def release(self, endpoint, substrate, failed=False):
+        """
+        Give back a connection from acquire(). Failed connections are closed, not reused.
+        """
+        with self.lock:
+            endpoint.in_flight -= 1
+            if not failed:
+                endpoint.idle_connections.append(substrate)
+        if failed:
+            self.close_all([substrate])
+
+    @contextmanager
+    def connection(self, pinned=None):
+        """
+        Context manager yielding a connection (to the `pinned` endpoint, if given). A connection
+        error inside the block marks the endpoint unhealthy so later queries fail over to another node.
+        """
+        endpoint, substrate = self.acquire(pinned)
+        try:
+            yield substrate
+        except CONNECTION_ERRORS as e:
+            self.release(endpoint, substrate, failed=True)
+            self.mark_failed(endpoint, e)
+            raise
+        except BaseException:
+            self.release(endpoint, substrate)
+            raise
+        else:
+            self.release(endpoint, substrate)
+
+    def run(self, func, pinned=None):
+        """
+        Call func(connection), retrying on the next node if the connection breaks.
+        Pinned to one endpoint, a broken connection is raised instead.
+        """
+        attempts = 1 if pinned else len(self.endpoints)
+        for attempt in range(attempts):
+            try:
+                with self.connection(pinned) as substrate:
+                    return func(substrate)
+            except CONNECTION_ERRORS:
+                if attempt == attempts - 1:
+                    raise
+
+    def mark_failed(self, endpoint, error):
+        """
+        Take an endpoint out of rotation with jittered exponential backoff.
+        """
+        with self.lock:
+            endpoint.failures += 1
+            endpoint.healthy = False
+            delay = min(self.backoff_max, self.backoff_base * 2 ** (endpoint.failures - 1))
+            endpoint.retry_at = time.time() + random.uniform(delay / 2, delay)
+            connections, endpoint.idle_connections = endpoint.idle_connections, []
+        self.close_all(connections)
+        metrics.NODE_CONNECTION_ERRORS.inc(node=endpoint.url)
+        logging.error(f"Node {endpoint.url} failed ({error}), retrying in up to {delay:.0f}s")
+
+    def mark_healthy(self, endpoint, latency):
+        with self.lock:
+            if not endpoint.healthy:
+                logging.info(f"Node {endpoint.url} is healthy again")
+            endpoint.healthy = True
+            endpoint.failures = 0
+            endpoint.retry_at = 0.0
+            # Smooth latency so one slow probe doesn't flip routing
+            endpoint.latency = latency if endpoint.latency is None else 0.7 * endpoint.latency + 0.3 * latency
+
+    def probe(self, endpoint):
+        """
+        Measure one system_health round trip on a fresh or idle connection of `endpoint`.
+        """
+        with self.lock:
+            substrate = endpoint.idle_connections.pop() if endpoint.idle_connections else None
+        try:
+            if substrate is None:
+                substrate = self.connect(endpoint.url)
+            start = time.perf_counter()
+            substrate.rpc_request("system_health", [])
+            latency = time.perf_counter() - start
+        except Exception as e:
+            if substrate is not None:
+                self.close_all([substrate])
+            self.mark_failed(endpoint, e)
+            return
+        with self.lock:
+            endpoint.idle_connections.append(substrate)
+        self.mark_healthy(endpoint, latency)
+
+    def check_health(self):
+        """
+        Probe healthy endpoints and failed ones whose backoff has expired.
+        """
+        now = time.time()
+        for endpoint in self.endpoints:
+            if endpoint.healthy or endpoint.retry_at <= now:
+                self.probe(endpoint)
+
+    def next_check_in(self):
+        """
+        Seconds until the next probe is due: the regular interval, or sooner if a
+        failed endpoint's backoff expires first.
+        """
+        now = time.time()
+        retries = [e.retry_at - now for e in self.endpoints if not e.healthy]
+        return max(0.5, min([self.health_check_interval] + retries))
+
+    def export_metrics(self):
+        """
+        Copy endpoint health into the metrics gauges (called at scrape time).
+        """
+        for endpoint in self.endpoints:
+            metrics.NODE_HEALTHY.set(1 if endpoint.healthy else 0, node=endpoint.url)
+            if endpoint.latency is not None:
+                metrics.NODE_LATENCY.set(endpoint.latency, node=endpoint.url)
+
+    def health_loop(self):
+        while not self.stop_event.wait(self.next_check_in()):
+            try:
+                self.check_health()
+            except Exception as e:
+                logging.error(f"Node health check failed: {e}")
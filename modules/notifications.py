@@ -1,65 +1,176 @@
-import requests
+import queue
+import random
+import threading
+import time
 import logging
 
+from modules import metrics, profiler
+
+
+class NotificationChannel:
+    def __init__(self, name, send, min_interval=1.0, timeout=10, max_retries=3, max_queue=1000):
+        """
+        One notification provider with its own queue, worker thread and keep-alive HTTP session.
+        `send(session, message, timeout)` performs the request and returns the response.
+        `min_interval` is the minimum number of seconds between two sends (provider rate limit).
+        """
+        self.name = name
+        self.send = send
+        self.min_interval = min_interval
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.session = None  # Created by the worker
+        self.next_send_at = 0.0
+        self.thread = threading.Thread(target=self.run, name=f"notify-{name}", daemon=True)
+        self.thread.start()
+
+    def submit(self, message):
+        """
+        Queue a message for delivery. Never blocks; drops the message if the queue is full.
+        """
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            logging.error(f"{self.name} notification queue is full, dropping message")
+
+    def close(self):
+        """
+        Ask the worker to stop once everything already queued is delivered.
+        """
+        self.queue.put(None)
+
+    def join(self, timeout=None):
+        self.thread.join(timeout)
+        if self.session:
+            self.session.close()
+
+    def run(self):
+        # requests is imported here, in the worker, to keep it off the startup path
+        import requests
+        self.session = requests.Session()
+        while True:
+            message = self.queue.get()
+            if message is None:
+                return
+            self.deliver(message)
+
+    def deliver(self, message):
+        """
+        Send one message, honouring the rate limit and retrying with jittered backoff.
+        Only connection errors, timeouts, 429 and 5xx responses are retried; any other
+        failure (a bad token or chat id, an invalid URL) would fail the same way again.
+        """
+        import requests
+        error = None
+        for attempt in range(self.max_retries + 1):
+            wait = self.next_send_at - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                with profiler.stage(f"notify.{self.name}"), metrics.NOTIFICATION_DURATION.time(channel=self.name):
+                    response = self.send(self.session, message, self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            except requests.RequestException as e:
+                error = e
+                break
+            else:
+                self.next_send_at = time.time() + self.min_interval
+                if response.status_code == 429:
+                    # Rate limited: wait as long as the provider asks before retrying
+                    self.next_send_at = time.time() + retry_after(response, self.min_interval)
+                    error = "rate limited (HTTP 429)"
+                    continue
+                if response.status_code < 400:
+                    metrics.NOTIFICATIONS_SENT.inc(channel=self.name)
+                    return
+                error = f"HTTP {response.status_code} {response.reason}"
+                if response.status_code < 500:
+                    break
+            time.sleep(min(30, 2 ** attempt) * random.uniform(0.5, 1.0))
+        metrics.NOTIFICATION_FAILURES.inc(channel=self.name)
+        logging.error(f"Error sending {self.name} notification: {error}")
+
+
+def retry_after(response, default):
+    """
+    Seconds to wait after a 429, from the Retry-After header or the JSON body
+    (Discord uses `retry_after`, Telegram `parameters.retry_after`).
+    """
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        pass
+    try:
+        body = response.json()
+        return float(body.get("retry_after") or body.get("parameters", {}).get("retry_after") or default)
+    except (ValueError, AttributeError):
+        return default
+
+
 class NotificationManager:
-    def __init__(self, discord_webhook=None, pushbullet_token=None, pushover_user_key=None, pushover_app_token=None, telegram_bot_token=None, telegram_chat_id=None):
+    def __init__(self, discord_webhook=None, pushbullet_token=None, pushover_user_key=None, pushover_app_token=None,
+                 telegram_bot_token=None, telegram_chat_id=None, timeout=10, max_retries=3):
         self.discord_webhook = discord_webhook
         self.pushbullet_token = pushbullet_token
         self.pushover_user_key = pushover_user_key
         self.pushover_app_token = pushover_app_token
         self.telegram_bot_token = telegram_bot_token
-        self.telegram_chat_id = telegram_chat_id, telegram_bot_token
+        self.telegram_chat_id = telegram_chat_id
+
+        # One worker per channel, so a slow provider never delays the others (or the monitor)
+        self.channels = []
+        def add_channel(name, send, min_interval):
+            self.channels.append(NotificationChannel(name, send, min_interval, timeout, max_retries))
 
-    def send_notification(self, message):
         if self.discord_webhook:
-            self._send_discord_notification(message)
+            add_channel("Discord", self._send_discord_notification, 2.0)  # ~30 requests/minute per webhook
         if self.pushbullet_token:
-            self._send_pushbullet_notification(message)
+            add_channel("Pushbullet", self._send_pushbullet_notification, 1.0)
         if self.pushover_app_token and self.pushover_user_key:
-            self._send_pushover_notification(message)
+            add_channel("Pushover", self._send_pushover_notification, 1.0)
         if self.telegram_chat_id and self.telegram_bot_token:
-            self._send_telegram_notification(message)
+            add_channel("Telegram", self._send_telegram_notification, 1.0)  # ~1 message/second per chat
 
-    def _send_discord_notification(self, message):
-        # logging.info("Sending Discord notification...")
-        try:
-            payload = {"content": message}
-            response = requests.post(self.discord_webhook, json=payload)
-            response.raise_for_status()
-        except Exception as e:
-            logging.error(f"Error sending Discord notification: {e}")
+    def send_notification(self, message):
+        """
+        Queue a message on every configured channel. Returns immediately.
+        """
+        for channel in self.channels:
+            channel.submit(message)
 
-    def _send_pushbullet_notification(self, message):
-        try:
-            headers = {
-                'Access-Token': self.pushbullet_token,
-                'Content-Type': 'application/json'
-            }
-            payload = {"type": "note", "title": "Balance Alert", "body": message}
-            response = requests.post("https://api.pushbullet.com/v2/pushes", json=payload, headers=headers)
-            response.raise_for_status()
-        except Exception as e:
-            logging.error(f"Error sending Pushbullet notification: {e}")
-
-    def _send_pushover_notification(self, message):
-        try:
-            payload = {
-                'user': self.pushover_config['user_key'],
-                'token': self.pushover_config['api_token'],
-                'message': message
-            }
-            response = requests.post("https://api.pushover.net/1/messages.json", data=payload)
-            response.raise_for_status()
-        except Exception as e:
-            logging.error(f"Error sending Pushover notification: {e}")
-
-    def _send_telegram_notification(self, message):
-        try:
-            bot_token = self.telegram_config['bot_token']
-            chat_id = self.telegram_config['chat_id']
-            url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-            payload = {'chat_id': chat_id, 'text': message}
-            response = requests.post(url, json=payload)
-            response.raise_for_status()
-        except Exception as e:
-            logging.error(f"Error sending Telegram notification: {e}")
+    def stop(self, timeout=10):
+        """
+        Flush queued notifications (for at most `timeout` seconds) and stop the channel workers.
+        """
+        deadline = time.time() + timeout
+        for channel in self.channels:
+            channel.close()
+        for channel in self.channels:
+            channel.join(max(0, deadline - time.time()))
+
+    def _send_discord_notification(self, session, message, timeout):
+        payload = {"content": message}
+        return session.post(self.discord_webhook, json=payload, timeout=timeout)
+
+    def _send_pushbullet_notification(self, session, message, timeout):
+        headers = {
+            'Access-Token': self.pushbullet_token,
+            'Content-Type': 'application/json'
+        }
+        payload = {"type": "note", "title": "Balance Alert", "body": message}
+        return session.post("https://api.pushbullet.com/v2/pushes", json=payload, headers=headers, timeout=timeout)
+
+    def _send_pushover_notification(self, session, message, timeout):
+        payload = {
+            'user': self.pushover_user_key,
+            'token': self.pushover_app_token,
+            'message': message
+        }
+        return session.post("https://api.pushover.net/1/messages.json", data=payload, timeout=timeout)
+
+    def _send_telegram_notification(self, session, message, timeout):
+        url = f"https://api.telegram.org/bot{self.telegram_bot_token}/sendMessage"
+        payload = {'chat_id': self.telegram_chat_id, 'text': message}
+        return session.post(url, json=payload, timeout=timeout)
@@ -0,0 +1,198 @@
+import cProfile
+import logging
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import nullcontext
+
+_DISABLED = nullcontext()
+
+
+class StageTimer:
+    __slots__ = ("samples", "start")
+
+    def __init__(self, samples):
+        self.samples = samples
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.samples.append(time.perf_counter() - self.start)
+
+
+class Profiler:
+    def __init__(self, max_samples=10000):
+        """
+        Named stage timers. Disabled by default: stage() then returns a shared no-op
+        context manager, so instrumented code pays one attribute check per stage.
+        Each stage keeps its last `max_samples` durations for percentiles.
+        """
+        self.enabled = False
+        self.max_samples = max_samples
+        self.stages = {}
+
+    def enable(self):
+        self.enabled = True
+
+    def stage(self, name):
+        """
+        Time a block: `with PROFILER.stage("monitor.fetch"): ...`
+        """
+        if not self.enabled:
+            return _DISABLED
+        samples = self.stages.get(name)
+        if samples is None:
+            samples = self.stages.setdefault(name, deque(maxlen=self.max_samples))
+        return StageTimer(samples)
+
+    def merge(self, stages):
+        """
+        Add samples timed elsewhere, e.g. in a shard process, as {stage: [seconds]}.
+        """
+        for name, samples in stages.items():
+            self.stages.setdefault(name, deque(maxlen=self.max_samples)).extend(samples)
+
+    def take_samples(self):
+        """
+        {stage: [seconds]} timed since the last call, for sending to another process.
+        """
+        taken = {}
+        for name, samples in list(self.stages.items()):
+            if samples:
+                taken[name] = list(samples)
+                samples.clear()
+        return taken
+
+    def report(self):
+        """
+        {stage: {"count", "p50", "p90", "p99", "max"}} in seconds, over the retained samples.
+        """
+        report = {}
+        for name, samples in list(self.stages.items()):
+            values = sorted(samples)
+            if not values:
+                continue
+            def percentile(p):
+                return values[min(len(values) - 1, int(p * len(values)))]
+            report[name] = {
+                "count": len(values),
+                "p50": percentile(0.50),
+                "p90": percentile(0.90),
+                "p99": percentile(0.99),
+                "max": values[-1],
+            }
+        return report
+
+    def log_report(self):
+        report = self.report()
+        if not report:
+            return
+        lines = [f"{'stage':<28} {'count':>7} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}"]
+        for name in sorted(report):
+            r = report[name]
+            lines.append(
+                f"{name:<28} {r['count']:>7} {r['p50'] * 1000:>9.2f} {r['p90'] * 1000:>9.2f} "
+                f"{r['p99'] * 1000:>9.2f} {r['max'] * 1000:>9.2f}"
+            )
+        logging.info("Stage timings:\n" + "\n".join(lines))
+
+
+PROFILER = Profiler()
+stage = PROFILER.stage
+
+
+class StackSampler:
+    def __init__(self, path, duration=60, interval=0.01):
+        """
+        Sample the stacks of every thread each `interval` seconds for `duration` seconds
+        and write them in collapsed form ("frame;frame;frame count" per line), which
+        flamegraph.pl, speedscope and similar tools read directly.
+        """
+        self.path = path
+        self.duration = duration
+        self.interval = interval
+        self.stacks = Counter()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="stack-sampler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+
+    def run(self):
+        own_id = threading.get_ident()
+        names = {}
+        deadline = time.monotonic() + self.duration
+        while time.monotonic() < deadline and not self.stop_event.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+        self.write()
+
+    def write(self):
+        with open(self.path, "w") as output:
+            for stack, count in self.stacks.most_common():
+                output.write(f"{stack} {count}\n")
+        logging.info(f"Wrote {sum(self.stacks.values())} stack samples to {self.path}")
+
+
+class CProfileCapture:
+    def __init__(self, path, duration=60):
+        """
+        Run cProfile on the event loop thread for `duration` seconds and save the stats
+        to `path` (open with `python -m pstats` or snakeviz). Work done in worker threads
+        is not included; use a collapsed stack file for that.
+        """
+        self.path = path
+        self.duration = duration
+        self.profile = cProfile.Profile()
+        self.timer = None
+        self.running = False
+
+    def start(self, loop):
+        self.profile.enable()
+        self.running = True
+        # Disable on the loop thread itself: cProfile hooks are per thread
+        self.timer = loop.call_later(self.duration, self.stop)
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        if self.timer:
+            self.timer.cancel()
+        self.profile.disable()
+        self.profile.dump_stats(self.path)
+        logging.info(f"Wrote cProfile stats to {self.path}")
+
+
+def start_capture(path, duration, loop):
+    """
+    Start a cProfile capture for *.prof / *.pstats paths, otherwise a collapsed stack sampler.
+    Either stops by itself after `duration` seconds; call stop() to end it early.
+    """
+    if path.endswith((".prof", ".pstats")):
+        capture = CProfileCapture(path, duration)
+        capture.start(loop)
+    else:
+        capture = StackSampler(path, duration)
+        capture.start()
+    logging.info(f"Profiling for {duration}s into {path}")
+    return capture
@@ -0,0 +1,130 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+
+
+class QueryServer:
+    def __init__(self, path, snapshots, max_watch_queue=1000):
+        """
+        Answer queries from other processes over a Unix socket, from cached data only.
+        Protocol: one command per line ("balances", "stats", "gpu", "rewards", "all" or "watch"),
+        one JSON document per line back. "watch" keeps the connection open and streams
+        every balance change. `snapshots` maps command names to functions returning
+        JSON-serialisable data.
+        """
+        self.path = path
+        self.snapshots = snapshots
+        self.max_watch_queue = max_watch_queue
+        self.watchers = set()
+        self.clients = set()
+        self.loop = None
+        self.server = None
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        if os.path.exists(self.path):
+            self.remove_stale_socket()
+        self.server = await asyncio.start_unix_server(self.handle_client, path=self.path)
+        os.chmod(self.path, 0o600)
+        logging.info(f"Query socket listening on {self.path}")
+
+    def remove_stale_socket(self):
+        """
+        Delete a socket file left behind by a previous run. Refuses to take over a socket
+        another instance is still listening on.
+        """
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(self.path)
+            except ConnectionRefusedError:
+                os.unlink(self.path)  # Nobody listening
+                return
+        raise RuntimeError(f"Query socket {self.path} is in use: another instance is already running")
+
+    async def stop(self):
+        if not self.server:
+            return  # Never started, so the socket file (if any) isn't ours
+        self.server.close()
+        await self.server.wait_closed()
+        # End open "watch" streams so their handlers finish before the loop goes away
+        for queue in list(self.watchers):
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)
+        if self.clients:
+            await asyncio.wait(self.clients, timeout=1)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def publish(self, event):
+        """
+        Push an event to every "watch" client. Safe to call from any thread.
+        """
+        if self.loop is None or not self.watchers:
+            return
+        self.loop.call_soon_threadsafe(self.dispatch, event)
+
+    def dispatch(self, event):
+        for queue in list(self.watchers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                pass  # Slow watcher; it misses events rather than stalling the monitor
+
+    async def handle_client(self, reader, writer):
+        task = asyncio.current_task()
+        self.clients.add(task)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode().strip()
+                if command == "watch":
+                    await self.watch(writer)
+                    break
+                await self.send(writer, self.answer(command))
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            self.clients.discard(task)
+
+    def answer(self, command):
+        if command == "all":
+            return {name: snapshot() for name, snapshot in self.snapshots.items()}
+        if command in self.snapshots:
+            return self.snapshots[command]()
+        return {"error": f"unknown command '{command}'", "commands": sorted(self.snapshots) + ["all", "watch"]}
+
+    async def watch(self, writer):
+        queue = asyncio.Queue(maxsize=self.max_watch_queue)
+        self.watchers.add(queue)
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    return
+                await self.send(writer, event)
+        finally:
+            self.watchers.discard(queue)
+
+    async def send(self, writer, data):
+        writer.write((json.dumps(data) + "\n").encode())
+        await writer.drain()
+
+
+def query(path, command):
+    """
+    Minimal client: send `command` and print the JSON line(s) that come back.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(path)
+        client.sendall((command + "\n").encode())
+        with client.makefile("r") as responses:
+            for line in responses:
+                print(line, end="", flush=True)
+                if command != "watch":
+                    break
@@ -0,0 +1,327 @@
+import logging
+import struct
+import threading
+import time
+from array import array
+
+from modules.balance_table import UNIT
+
+# (name, seconds covered, buckets): 5 minute buckets for 1h, hourly for 24h, 6-hourly for 7d
+WINDOWS = (("1h", 3600, 12), ("24h", 86400, 24), ("7d", 7 * 86400, 28))
+HEADER = struct.Struct("<dd")  # Tracking since, last reward (0 if none yet)
+HEAD = struct.Struct("<q")  # Newest bucket index (-1 if none yet)
+PORTFOLIO = "*"  # Key of the all-wallets tracker
+
+
+class RollingWindow:
+    __slots__ = ("span", "width", "amounts", "counts", "head", "amount", "count")
+
+    def __init__(self, span, buckets):
+        """
+        Total and number of rewards over the last `span` seconds, kept in `buckets` fixed
+        time buckets. Adding and reading are O(1): buckets that fall out of the window are
+        taken off the running totals as time moves past them.
+        """
+        self.span = span
+        self.width = span / buckets
+        self.amounts = array("d", [0.0]) * buckets  # AI3
+        self.counts = array("I", [0]) * buckets
+        self.head = None  # Index (time // width) of the newest bucket
+        self.amount = 0.0
+        self.count = 0
+
+    def advance(self, now):
+        index = int(now // self.width)
+        if self.head is not None and index <= self.head:
+            return  # Same bucket (or the clock went back)
+        size = len(self.amounts)
+        if self.head is None or index - self.head >= size:
+            for slot in range(size):
+                self.amounts[slot] = 0.0
+                self.counts[slot] = 0
+            self.amount = 0.0
+            self.count = 0
+        else:
+            for i in range(self.head + 1, index + 1):
+                slot = i % size
+                self.amount -= self.amounts[slot]
+                self.count -= self.counts[slot]
+                self.amounts[slot] = 0.0
+                self.counts[slot] = 0
+            if not self.count:
+                self.amount = 0.0  # Don't let float rounding linger in an empty window
+        self.head = index
+
+    def add(self, now, amount):
+        """
+        Count `amount` at time `now`. A reward older than the newest bucket (the event
+        scanner catching up) goes into its own bucket, or nowhere if it is out of the window.
+        """
+        self.advance(now)
+        index = int(now // self.width)
+        if index <= self.head - len(self.amounts):
+            return
+        slot = index % len(self.amounts)
+        self.amounts[slot] += amount
+        self.counts[slot] += 1
+        self.amount += amount
+        self.count += 1
+
+
+class RewardTracker:
+    __slots__ = ("since", "last_reward", "windows")
+
+    def __init__(self, since):
+        self.since = since
+        self.last_reward = None
+        self.windows = [RollingWindow(span, buckets) for _, span, buckets in WINDOWS]
+
+    def add(self, now, amount):
+        self.last_reward = now if self.last_reward is None else max(self.last_reward, now)
+        for window in self.windows:
+            window.add(now, amount)
+
+    def stats(self, now):
+        """
+        AI3 per hour and reward count per window, seconds since the last reward, and the
+        average seconds between rewards over 7d ("expected") and 24h ("observed").
+        """
+        rate, rewards, covered = {}, {}, {}
+        for (name, _, _), window in zip(WINDOWS, self.windows):
+            window.advance(now)
+            # Until we have watched a whole window, rates are over the time we have
+            covered[name] = max(1.0, min(window.span, now - self.since))
+            rate[name] = window.amount / covered[name] * 3600
+            rewards[name] = window.count
+        return {
+            "rate": rate,
+            "rewards": rewards,
+            "since_last": now - self.last_reward if self.last_reward is not None else None,
+            "expected_interval": covered["7d"] / rewards["7d"] if rewards["7d"] else None,
+            "observed_interval": covered["24h"] / rewards["24h"] if rewards["24h"] else None,
+            "tracked": now - self.since,
+        }
+
+    def state(self):
+        """
+        The tracker as bytes, for saving across restarts.
+        """
+        parts = [HEADER.pack(self.since, self.last_reward or 0.0)]
+        for window in self.windows:
+            parts += [HEAD.pack(-1 if window.head is None else window.head), window.amounts.tobytes(), window.counts.tobytes()]
+        return b"".join(parts)
+
+    @classmethod
+    def from_state(cls, data):
+        """
+        A tracker saved by state(), or None if it was saved with different windows.
+        """
+        if len(data) < HEADER.size:
+            return None
+        since, last_reward = HEADER.unpack_from(data)
+        tracker = cls(since)
+        tracker.last_reward = last_reward or None
+        offset = HEADER.size
+        for window in tracker.windows:
+            if offset + HEAD.size > len(data):
+                return None
+            head, = HEAD.unpack_from(data, offset)
+            offset += HEAD.size
+            for values in (window.amounts, window.counts):
+                size = len(values) * values.itemsize
+                chunk = data[offset:offset + size]
+                if len(chunk) != size:
+                    return None
+                values[:] = array(values.typecode, chunk)
+                offset += size
+            window.head = None if head < 0 else head
+            window.amount = sum(window.amounts)
+            window.count = sum(window.counts)
+        return tracker if offset == len(data) else None
+
+
+class RewardStats:
+    def __init__(self):
+        """
+        Rolling reward statistics per address and for all wallets together, updated
+        in O(1) on every recorded reward, at its block's time if known (otherwise when
+        it was seen). The caller decides what is a reward (a reward event, or a small
+        incoming change without events). Only fixed-size buckets are kept, never the
+        rewards themselves. Addresses get a tracker on their first reward.
+        """
+        self.started = time.time()
+        self.trackers = {}
+        self.portfolio = RewardTracker(self.started)
+        self.lock = threading.Lock()
+
+    def record(self, address, change, now=None):
+        """
+        Count a reward of `change` (in the smallest unit) at time `now` (default: now);
+        anything not positive is ignored.
+        """
+        if change <= 0:
+            return
+        now = time.time() if now is None else now
+        amount = change / UNIT
+        with self.lock:
+            tracker = self.trackers.get(address)
+            if tracker is None:
+                tracker = self.trackers[address] = RewardTracker(self.started)
+            tracker.add(now, amount)
+            self.portfolio.add(now, amount)
+
+    def stats(self, address=PORTFOLIO, now=None):
+        """
+        RewardTracker.stats() for `address`, or for all wallets by default.
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            tracker = self.portfolio if address == PORTFOLIO else self.trackers.get(address)
+            if tracker is None:
+                tracker = RewardTracker(self.started)
+            return tracker.stats(now)
+
+    def snapshot(self):
+        """
+        Stats of every wallet with rewards and of all wallets together (for the query socket).
+        """
+        now = time.time()
+        with self.lock:
+            addresses = list(self.trackers)
+        return {
+            "portfolio": self.stats(now=now),
+            "addresses": {address: self.stats(address, now) for address in addresses},
+        }
+
+    def state(self):
+        """
+        [(address, bytes)] of every tracker, with the all-wallets one under PORTFOLIO.
+        """
+        with self.lock:
+            rows = [(address, tracker.state()) for address, tracker in self.trackers.items()]
+            rows.append((PORTFOLIO, self.portfolio.state()))
+        return rows
+
+    def load(self, rows, addresses):
+        """
+        Restore trackers saved by state(), for the addresses still watched.
+        """
+        watched = set(addresses)
+        loaded = 0
+        with self.lock:
+            for address, data in rows:
+                tracker = RewardTracker.from_state(data)
+                if tracker is None or (address != PORTFOLIO and address not in watched):
+                    continue
+                if address == PORTFOLIO:
+                    self.portfolio = tracker
+                else:
+                    self.trackers[address] = tracker
+                    loaded += 1
+            # Tracking started when the oldest restored tracker did
+            self.started = min([self.started, self.portfolio.since])
+        if loaded:
+            logging.info(f"Loaded reward statistics of {loaded} wallets")
+
+
+def format_duration(seconds):
+    """
+    A short duration, e.g. 45s, 12m, 3h 05m, 2d 4h.
+    """
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m"
+    if seconds < 86400:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    return f"{seconds // 86400}d {seconds % 86400 // 3600}h"
+
+
+def format_rewards(stats):
+    """
+    Status bar text for RewardTracker.stats(), e.g. "0.41 AI3/h (7d 0.45), last 12m".
+    """
+    if stats["since_last"] is None:
+        return "no rewards yet"
+    return f"{stats['rate']['24h']:.2f} AI3/h (7d {stats['rate']['7d']:.2f}), last {format_duration(stats['since_last'])}"
+
+
+class RewardAlerts:
+    def __init__(self, reward_stats, notify, label, stall_factor=3, rate_drop=30, min_rewards=10, max_lines=20):
+        """
+        Alert when a wallet (or all wallets together) gets no reward for `stall_factor`
+        times its usual interval, or its 24h reward rate is `rate_drop` percent below its
+        7d rate. Only wallets with at least `min_rewards` rewards in the last 7 days are
+        checked, and the 7d rate only counts once it covers at least two days. Each
+        alert is sent once until the condition clears; a stalled wallet's next reward is
+        reported too. `label(address)` names a wallet in messages. Set a rule to 0 to
+        disable it.
+        """
+        self.stats = reward_stats
+        self.notify = notify
+        self.label = label
+        self.stall_factor = stall_factor
+        self.rate_drop = rate_drop
+        self.min_rewards = min_rewards
+        self.max_lines = max_lines
+        self.active = set()  # (address, rule) alerts already sent
+
+    def check(self, now=None):
+        """
+        Evaluate both rules for every tracked wallet and send one message with whatever
+        started or ended since the last check. O(wallets), independent of history length.
+        """
+        now = time.time() if now is None else now
+        with self.stats.lock:
+            addresses = list(self.stats.trackers)
+        lines = []
+        # With one wallet, "all wallets" would only repeat it
+        for address in ([PORTFOLIO] if len(addresses) > 1 else []) + addresses:
+            stats = self.stats.stats(address, now)
+            name = "all wallets" if address == PORTFOLIO else self.label(address)
+            lines += self.check_stall(address, name, stats)
+            lines += self.check_rate(address, name, stats)
+        if not lines:
+            return
+        if len(lines) > self.max_lines:
+            lines = lines[:self.max_lines] + [f"... and {len(lines) - self.max_lines} more"]
+        message = lines[0] if len(lines) == 1 else "Reward alerts:\n" + "\n".join(lines)
+        logging.warning(message)
+        self.notify(message)
+
+    def check_stall(self, address, name, stats):
+        key = (address, "stall")
+        expected = stats["expected_interval"]
+        stalled = (
+            self.stall_factor and expected and stats["rewards"]["7d"] >= self.min_rewards
+            and stats["since_last"] > self.stall_factor * expected
+        )
+        if stalled and key not in self.active:
+            self.active.add(key)
+            return [
+                f"No reward for {name} in {format_duration(stats['since_last'])} "
+                f"(usually every {format_duration(expected)})"
+            ]
+        if not stalled and key in self.active:
+            self.active.discard(key)
+            if stats["since_last"] is not None and stats["since_last"] < (expected or 0):
+                return [f"Rewards resumed for {name}"]
+        return []
+
+    def check_rate(self, address, name, stats):
+        key = (address, "rate")
+        rate, week = stats["rate"]["24h"], stats["rate"]["7d"]
+        dropped = (
+            self.rate_drop and stats["rewards"]["7d"] >= self.min_rewards and stats["tracked"] >= 2 * 86400
+            and week > 0 and rate < week * (1 - self.rate_drop / 100)
+        )
+        if dropped and key not in self.active:
+            self.active.add(key)
+            return [
+                f"Reward rate for {name} is down {100 * (1 - rate / week):.0f}% "
+                f"(24h {rate:.2f} AI3/h vs 7d {week:.2f} AI3/h)"
+            ]
+        if not dropped:
+            self.active.discard(key)
+        return []
@@ -0,0 +1,210 @@
+import logging
+import threading
+from collections import Counter, deque
+
+# (module, event) -> [(account attribute, amount attribute, reason, sign)]
+KNOWN_EVENTS = {
+    ("Rewards", "BlockReward"): [("block_author", "reward", "block reward", 1)],
+    ("Rewards", "VoteReward"): [("voter", "reward", "vote reward", 1)],
+    ("Balances", "Transfer"): [("from", "amount", "transfer out", -1), ("to", "amount", "transfer in", 1)],
+    ("TransactionPayment", "TransactionFeePaid"): [("who", "actual_fee", "fee", -1)],
+}
+REWARD_REASONS = {"block reward", "vote reward"}
+# Generic balance movements, only reported when nothing more specific explains them
+FALLBACK_EVENTS = {
+    ("Balances", "Deposit"): [("who", "amount", "deposit", 1)],
+    ("Balances", "Withdraw"): [("who", "amount", "withdrawal", -1)],
+}
+# What a pruning node answers for the state of a block it no longer keeps
+PRUNED_STATE_ERROR = "State already discarded"
+
+
+class EventScanner:
+    def __init__(self, addresses, run_on_connection, history=None, follow="head", max_blocks=500):
+        """
+        Walk blocks from the last checkpoint and attribute System.Events to the configured
+        addresses (rewards, transfers, fees). `follow` is "head" (lowest latency) or
+        "finalized" (no reorgs). At most `max_blocks` blocks are processed per scan() call.
+        """
+        self.addresses = addresses
+        self.run_on_connection = run_on_connection
+        self.history = history
+        self.follow = follow
+        self.max_blocks = max_blocks
+        self.index = None
+        self.last_block = history.checkpoint("events") if history else None
+        self.lock = threading.Lock()
+        self.scan_lock = threading.Lock()
+        self.pending = {}
+        self.notified = {}  # address -> highest block whose reasons were taken (or given up on)
+        self.listeners = []  # Called with the records and block times of every scan that processed blocks
+
+    def build_index(self, substrate):
+        """
+        Map every form an account can take in decoded events (SS58 with any prefix, public
+        key hex) to its configured address, so matching an attribute is one set lookup.
+        """
+        from scalecodec.utils.ss58 import ss58_decode, ss58_encode
+
+        index = {}
+        for address in self.addresses:
+            public_key = ss58_decode(address)
+            index[address] = address
+            index[public_key] = address
+            index[f"0x{public_key}"] = address
+            if substrate.ss58_format is not None:
+                index[ss58_encode(public_key, substrate.ss58_format)] = address
+        return index
+
+    def target_block(self, substrate):
+        if self.follow == "finalized":
+            return substrate.get_block_number(substrate.get_chain_finalised_head())
+        return substrate.get_block_number(substrate.get_chain_head())
+
+    def scan(self, up_to=None, pinned=None):
+        """
+        Process blocks after the checkpoint up to `up_to` (default: the followed head).
+        Pass the endpoint that reported `up_to` as `pinned`: another node may not have
+        those blocks yet. Blocking; returns the number of blocks processed.
+        """
+        with self.scan_lock:
+            return self.run_on_connection(lambda substrate: self.scan_on_connection(substrate, up_to), pinned)
+
+    def scan_on_connection(self, substrate, up_to):
+        if self.index is None:
+            self.index = self.build_index(substrate)
+        if up_to is None:
+            up_to = self.target_block(substrate)
+        if self.last_block is None:
+            # First run: start from now, older blocks are the backfill's job
+            self.last_block = up_to - 1
+
+        start = self.last_block + 1
+        end = min(up_to, self.last_block + self.max_blocks)
+        records, block_times = [], {}
+        for block_number in range(start, end + 1):
+            block_hash = substrate.get_block_hash(block_number)
+            if block_hash is None:
+                # Not on this node yet; stop here rather than skip it
+                end = block_number - 1
+                break
+            try:
+                events = substrate.get_events(block_hash)
+            except Exception as e:
+                if block_number != start or PRUNED_STATE_ERROR not in str(e):
+                    raise
+                self.skip_pruned(substrate, start, up_to)
+                return self.scan_on_connection(substrate, up_to)
+            block_records = self.attribute(block_number, events)
+            if block_records and self.listeners:
+                block_times[block_number] = self.block_time(substrate, block_hash)
+            records.extend(block_records)
+
+        if end >= start:
+            self.last_block = end
+            if self.history:
+                self.history.record_events(records, end)
+            with self.lock:
+                for record in records:
+                    # A change already notified without its reasons must not lend them to the next one
+                    if record[1] > self.notified.get(record[0], -1):
+                        self.pending.setdefault(record[0], deque(maxlen=100)).append(record)
+            for listener in self.listeners:
+                listener(records, block_times)
+            if end < up_to:
+                logging.info(f"Event scanner catching up: block #{end} of #{up_to}")
+        return max(0, end - start + 1)
+
+    @staticmethod
+    def block_time(substrate, block_hash):
+        """
+        Unix time of a block, from its Timestamp.Now (milliseconds).
+        """
+        return substrate.query("Timestamp", "Now", block_hash=block_hash).value / 1000
+
+    def skip_pruned(self, substrate, start, up_to):
+        """
+        The node has discarded the state of block `start` (the scanner was stopped for longer
+        than the node keeps state), so its events can't be read. Move the checkpoint past
+        the oldest block whose state is still there, found by bisection, and log the gap.
+        """
+        low, high = start + 1, up_to
+        while low < high:
+            middle = (low + high) // 2
+            try:
+                substrate.get_events(substrate.get_block_hash(middle))
+                high = middle
+            except Exception as e:
+                if PRUNED_STATE_ERROR not in str(e):
+                    raise
+                low = middle + 1
+        logging.warning(
+            f"Event scanner: the node no longer has the state of blocks #{start}-#{low - 1}, skipping "
+            f"their events (backfill them from an archive node)"
+        )
+        self.last_block = low - 1
+        if self.history:
+            self.history.record_events([], self.last_block)
+
+    def attribute(self, block_number, events):
+        """
+        Turn one block's events into (address, block_number, reason, amount) records.
+        """
+        specific, fallback = [], []
+        for event in events:
+            value = event.value
+            event_key = (value.get("module_id"), value.get("event_id"))
+            if event_key in KNOWN_EVENTS:
+                rules, target = KNOWN_EVENTS[event_key], specific
+            elif event_key in FALLBACK_EVENTS:
+                rules, target = FALLBACK_EVENTS[event_key], fallback
+            else:
+                continue
+            attributes = value.get("attributes")
+            if not isinstance(attributes, dict):
+                continue
+            for account_field, amount_field, reason, sign in rules:
+                account = attributes.get(account_field)
+                address = self.index.get(account) if isinstance(account, str) else None
+                if address is not None:
+                    amount = sign * int(attributes.get(amount_field) or 0)
+                    target.append((address, block_number, reason, amount))
+
+        explained = {record[0] for record in specific}
+        return specific + [record for record in fallback if record[0] not in explained]
+
+    def reached(self, block_number):
+        """
+        True once blocks up to `block_number` have been scanned.
+        """
+        return self.last_block is not None and self.last_block >= block_number
+
+    def pop_reasons(self, address, up_to=None):
+        """
+        Take the attributions seen for `address` since the last call, only those of blocks
+        up to `up_to` if given (the block a change was seen at). Later ones stay for the
+        change they belong to.
+        """
+        with self.lock:
+            if up_to is None:
+                records = self.pending.pop(address, None)
+                return list(records) if records else []
+            self.notified[address] = max(self.notified.get(address, -1), up_to)
+            records = self.pending.get(address)
+            taken = []
+            while records and records[0][1] <= up_to:
+                taken.append(records.popleft())
+            if address in self.pending and not records:
+                del self.pending[address]
+        return taken
+
+    @staticmethod
+    def summarize(records):
+        """
+        Short text for a notification, e.g. "vote reward x3, fee (block #1234)".
+        """
+        if not records:
+            return ""
+        counts = Counter(record[2] for record in records)
+        reasons = ", ".join(reason if count == 1 else f"{reason} x{count}" for reason, count in counts.items())
+        return f"{reasons} (block #{records[-1][1]})"
@@ -0,0 +1,142 @@
+import asyncio
+import heapq
+import random
+import threading
+import time
+
+
+class AddressState:
+    __slots__ = ("interval", "last_checked", "last_changed", "change_gap")
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.last_checked = None
+        self.last_changed = None
+        self.change_gap = None  # Smoothed seconds between changes, None until seen twice
+
+
+class PollScheduler:
+    def __init__(self, addresses, min_interval=6, max_staleness=600, backoff=1.5, jitter=0.1):
+        """
+        Decide which addresses to query next. Each address has its own poll interval:
+        it drops to `min_interval` when the balance changes and grows by `backoff` on
+        every unchanged check, up to a quarter of the address's typical time between
+        changes (so busy wallets stay fast) and never beyond `max_staleness`.
+        Due addresses come out of a heap ordered by due time, so the most overdue go
+        first when the RPC budget is short.
+        """
+        self.min_interval = min_interval
+        self.max_staleness = max(max_staleness, min_interval)
+        self.backoff = backoff
+        self.jitter = jitter
+        self.states = {address: AddressState(min_interval) for address in addresses}
+        now = time.monotonic()
+        self.heap = [(now, address) for address in addresses]
+        heapq.heapify(self.heap)
+
+    def next_due_in(self):
+        """
+        Seconds until the next address is due (0 if one is overdue, None if nothing is scheduled).
+        """
+        if not self.heap:
+            return None
+        return max(0.0, self.heap[0][0] - time.monotonic())
+
+    def overdue(self):
+        """
+        Seconds the most overdue address is past its due time (0 if none is).
+        """
+        if not self.heap:
+            return 0.0
+        return max(0.0, time.monotonic() - self.heap[0][0])
+
+    def pop_due(self, limit, horizon=0):
+        """
+        Remove and return up to `limit` addresses due within `horizon` seconds, most
+        overdue first. Taking the nearly-due ones too batches them into fewer requests.
+        Each must be handed back through record() or retry().
+        """
+        cutoff = time.monotonic() + horizon
+        due = []
+        while self.heap and self.heap[0][0] <= cutoff and len(due) < limit:
+            due.append(heapq.heappop(self.heap)[1])
+        return due
+
+    def record(self, address, changed):
+        """
+        Reschedule `address` after a successful check.
+        """
+        state = self.states[address]
+        now = time.monotonic()
+        state.last_checked = now
+        if changed:
+            if state.last_changed is not None:
+                gap = now - state.last_changed
+                state.change_gap = gap if state.change_gap is None else 0.7 * state.change_gap + 0.3 * gap
+            state.last_changed = now
+            state.interval = self.min_interval
+        else:
+            ceiling = self.max_staleness
+            if state.change_gap is not None:
+                ceiling = min(ceiling, max(self.min_interval, state.change_gap / 4))
+            state.interval = min(ceiling, state.interval * self.backoff)
+        self.schedule(address, state.interval)
+
+    def retry(self, address):
+        """
+        Reschedule an address whose check failed, soon but not immediately.
+        """
+        self.schedule(address, self.min_interval)
+
+    def schedule(self, address, interval):
+        # Jitter spreads addresses that backed off together over time
+        interval *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        heapq.heappush(self.heap, (time.monotonic() + min(interval, self.max_staleness), address))
+
+    def summary(self):
+        """
+        How many addresses are polled fast (changed recently), backing off, or at max_staleness.
+        """
+        summary = {"active": 0, "backing_off": 0, "idle": 0}
+        for state in self.states.values():
+            if state.interval <= self.min_interval * self.backoff:
+                summary["active"] += 1
+            elif state.interval < self.max_staleness:
+                summary["backing_off"] += 1
+            else:
+                summary["idle"] += 1
+        return summary
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        """
+        Allow on average `rate` acquisitions per second, with bursts of up to `burst`.
+        Shared by threads and the event loop: callers reserve a token and wait until it
+        is theirs, so they are served in order.
+        """
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Take a token and return the seconds to wait before using it.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+    async def acquire(self):
+        await asyncio.sleep(self.reserve())
+
+    def wait(self):
+        """
+        Blocking acquire(), for worker threads.
+        """
+        time.sleep(self.reserve())
@@ -0,0 +1,196 @@
+import json
+import logging
+import multiprocessing
+import struct
+import threading
+import time
+from multiprocessing.connection import wait
+
+# Messages from a shard process; the first byte says which kind
+CHANGES = b"C"  # Balances that changed in one check
+READY = b"R"  # Initial balances sent (or failed): the shard is up
+STAGES = b"S"  # Stage timing samples, when profiling
+# The one message to a shard process
+STOP = b"Q"
+
+HEADER = struct.Struct("<qI")  # Block number (-1 if unknown), record count
+RECORD = struct.Struct("<I16s")  # Address index within the shard, free balance (u128, little-endian)
+STAGES_INTERVAL = 10  # Seconds between stage timing uploads from a profiled shard
+
+
+def encode_changes(block_number, changes):
+    """
+    One CHANGES message for [(address index within the shard, balance)], 20 bytes per record.
+    """
+    return CHANGES + HEADER.pack(-1 if block_number is None else block_number, len(changes)) + b"".join(
+        RECORD.pack(index, balance.to_bytes(16, "little")) for index, balance in changes
+    )
+
+
+def decode_changes(data, addresses):
+    """
+    (block number, {address: balance}) from a CHANGES message of the shard watching `addresses`.
+    """
+    block_number, count = HEADER.unpack_from(data, 1)
+    records = RECORD.iter_unpack(memoryview(data)[1 + HEADER.size:])
+    balances = {addresses[index]: int.from_bytes(balance, "little") for index, balance in records}
+    return (None if block_number < 0 else block_number), balances
+
+
+def encode_stages(stages):
+    """
+    One STAGES message for {stage: [seconds]}.
+    """
+    return STAGES + json.dumps(stages).encode()
+
+
+def wait_for_stop(connection, stop_event):
+    """
+    In a shard: block until the coordinator sends STOP over `connection`, or is gone
+    without doing so (killed, or stopped by a signal it doesn't handle), then set stop_event.
+    """
+    parent = multiprocessing.parent_process()
+    wait([connection] + ([parent.sentinel] if parent else []))
+    if parent and not parent.is_alive():
+        logging.warning("Coordinator exited, stopping")
+    stop_event.set()
+
+
+class Shard:
+    def __init__(self, number, addresses, settings):
+        self.number = number
+        self.addresses = addresses
+        self.settings = settings
+        self.process = None
+        self.connection = None
+        self.ready = False
+        self.failures = 0
+        self.restart_at = None
+
+
+class ShardCoordinator:
+    def __init__(self, addresses, shards, target, settings, node_urls=None, on_stages=None):
+        """
+        Split `addresses` into `shards` contiguous slices, each watched by its own process
+        running target(number, addresses, settings, connection). Shards stream compact
+        change records back over the pipe `connection`; receive() turns them into balances
+        for the coordinator, which owns notifications, history and the status bar. With `node_urls`,
+        shard N uses node_urls[N % len(node_urls)] (a URL or a list) instead of
+        settings["node_url"]. A shard that exits is restarted with backoff.
+        """
+        self.context = multiprocessing.get_context("spawn")  # Forking a process with threads isn't safe
+        # Shards are stopped through their pipe: a shared multiprocessing.Event hangs set()
+        # for good once a process waiting on it has been killed
+        self.stop_event = threading.Event()
+        self.target = target
+        self.on_stages = on_stages
+        self.lock = threading.Lock()
+        size = -(-len(addresses) // shards)
+        self.shards = []
+        for number, start in enumerate(range(0, len(addresses), size)):
+            shard_settings = dict(settings)
+            if node_urls:
+                shard_settings["node_url"] = node_urls[number % len(node_urls)]
+            self.shards.append(Shard(number, addresses[start:start + size], shard_settings))
+
+    def start(self):
+        for shard in self.shards:
+            self.start_shard(shard)
+        logging.info(
+            f"Started {len(self.shards)} shard processes with up to {len(self.shards[0].addresses)} addresses each"
+        )
+
+    def start_shard(self, shard):
+        connection, shard_connection = self.context.Pipe()
+        shard.process = self.context.Process(
+            target=self.target,
+            args=(shard.number, shard.addresses, shard.settings, shard_connection),
+            name=f"shard-{shard.number}",
+            daemon=True,
+        )
+        shard.process.start()
+        shard_connection.close()  # Held by the shard only, so reading hits EOF once it exits
+        shard.connection = connection
+        shard.ready = False
+        shard.restart_at = None
+
+    def started(self):
+        """
+        True once every running shard has sent its initial balances.
+        """
+        return all(shard.ready or shard.connection is None for shard in self.shards)
+
+    def receive(self, timeout=1):
+        """
+        Wait up to `timeout` seconds for messages from the shards and return their change
+        records as [(block number, {address: balance})]. Also restarts shards that are due.
+        """
+        with self.lock:
+            self.restart_due()
+            by_connection = {shard.connection: shard for shard in self.shards if shard.connection}
+            if not by_connection:
+                self.stop_event.wait(timeout)
+                return []
+            records = []
+            for connection in wait(list(by_connection), timeout):
+                shard = by_connection[connection]
+                try:
+                    while connection.poll():
+                        self.handle(shard, connection.recv_bytes(), records)
+                except (EOFError, OSError):
+                    self.lost(shard)
+            return records
+
+    def handle(self, shard, data, records):
+        kind = data[:1]
+        if kind == CHANGES:
+            records.append(decode_changes(data, shard.addresses))
+        elif kind == READY:
+            shard.ready = True
+            shard.failures = 0
+        elif kind == STAGES and self.on_stages:
+            self.on_stages(json.loads(data[1:]))
+
+    def lost(self, shard):
+        shard.connection.close()
+        shard.connection = None
+        shard.process.join(1)
+        if self.stop_event.is_set():
+            return
+        shard.failures += 1
+        delay = min(60, 2 ** (shard.failures - 1))
+        shard.restart_at = time.monotonic() + delay
+        logging.error(f"Shard {shard.number} exited (code {shard.process.exitcode}), restarting in {delay}s")
+
+    def restart_due(self):
+        now = time.monotonic()
+        for shard in self.shards:
+            if shard.restart_at is not None and shard.restart_at <= now and not self.stop_event.is_set():
+                logging.info(f"Restarting shard {shard.number}")
+                self.start_shard(shard)
+
+    def stop(self, timeout=10):
+        """
+        Ask every shard to stop and wait for them, collecting their last stage timings.
+        Change records still in flight are dropped, like a check cut short on shutdown.
+        """
+        self.stop_event.set()
+        for shard in self.shards:
+            if shard.connection:
+                try:
+                    shard.connection.send_bytes(STOP)
+                except OSError:
+                    pass  # Already gone; receive() notices
+        deadline = time.monotonic() + timeout
+        while any(shard.connection for shard in self.shards) and time.monotonic() < deadline:
+            self.receive(deadline - time.monotonic())
+        for shard in self.shards:
+            if shard.process:
+                shard.process.join(max(0, deadline - time.monotonic()))
+            if shard.process and shard.process.is_alive():
+                logging.warning(f"Shard {shard.number} didn't stop in time, terminating it")
+                shard.process.terminate()
+                shard.process.join()
+            if shard.connection:
+                shard.connection.close()
+                shard.connection = None
@@ -0,0 +1,116 @@
+import errno
+import logging
+import os
+import shutil
+import stat
+import sys
+
+DEFAULT_TEMPLATE = "{wallet} | {rewards} | {system} | {gpu}"
+
+
+class StatusSink:
+    def __init__(self, width=None, template=DEFAULT_TEMPLATE, only_changes=True):
+        """
+        Somewhere a status line goes. `width` defaults to the terminal width at startup.
+        """
+        self.width = width or shutil.get_terminal_size().columns
+        self.template = template
+        self.only_changes = only_changes
+        self.last_line = None
+
+    def max_gpus(self):
+        return 2 if self.width < 120 else 3
+
+    def render(self, fields):
+        gpu_lines = fields["gpu_lines"][:self.max_gpus()]
+        line = self.template.format(gpu=" | ".join(gpu_lines), **fields)
+        return line[:self.width]  # Truncate if necessary
+
+    def update(self, fields):
+        line = self.render(fields)
+        if self.only_changes and line == self.last_line:
+            return
+        self.write(line)
+        self.last_line = line
+
+    def write(self, line):
+        raise NotImplementedError
+
+
+class FileSink(StatusSink):
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+
+    def write(self, line):
+        # Write to a temp file and rename over the target, so tmux never reads a partial line
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as status_file:
+            status_file.write(line + "\n")
+        os.replace(temp_path, self.path)
+
+
+class StdoutSink(StatusSink):
+    def write(self, line):
+        print(line, file=sys.stdout, flush=True)
+
+
+class FifoSink(StatusSink):
+    def __init__(self, path, **kwargs):
+        # A reader consumes each line, so write every update, not only changes
+        kwargs.setdefault("only_changes", False)
+        super().__init__(**kwargs)
+        self.path = path
+        if not os.path.exists(self.path):
+            os.mkfifo(self.path)
+        elif not stat.S_ISFIFO(os.stat(self.path).st_mode):
+            raise ValueError(f"{self.path} exists and is not a FIFO")
+
+    def write(self, line):
+        try:
+            fd = os.open(self.path, os.O_WRONLY | os.O_NONBLOCK)
+        except OSError as e:
+            if e.errno == errno.ENXIO:
+                return  # Nobody is reading right now
+            raise
+        try:
+            os.write(fd, (line + "\n").encode())
+        except BlockingIOError:
+            pass
+        finally:
+            os.close(fd)
+
+
+SINK_TYPES = {"file": FileSink, "stdout": StdoutSink, "fifo": FifoSink}
+
+
+def create_sinks(sink_configs, default_path):
+    """
+    Build sinks from the `status_sinks` config list, or a single file sink at `default_path`.
+    """
+    if not sink_configs:
+        return [FileSink(default_path)]
+    sinks = []
+    for sink_config in sink_configs:
+        sink_config = dict(sink_config)
+        sink_type = sink_config.pop("type", "file")
+        if sink_type not in SINK_TYPES:
+            logging.error(f"Unknown status sink type '{sink_type}', skipping")
+            continue
+        sinks.append(SINK_TYPES[sink_type](**sink_config))
+    return sinks
+
+
+class StatusRenderer:
+    def __init__(self, sinks):
+        """
+        Render one snapshot of cached data to every sink.
+        """
+        self.sinks = sinks
+
+    def render(self, fields):
+        for sink in self.sinks:
+            try:
+                sink.update(fields)
+            except Exception as e:
+                logging.error(f"Failed to write status to {type(sink).__name__}: {e}")
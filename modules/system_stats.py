@@ -0,0 +1,105 @@
+import logging
+import threading
+import time
+from collections import deque
+
+from modules import profiler
+
+
+class SystemSampler:
+    def __init__(self, interval=1.0, window=60):
+        """
+        Sample CPU (overall and per core), memory, disk I/O and network throughput every
+        `interval` seconds into fixed-size ring buffers covering `window` seconds.
+        After each sample, min/avg/max over the window are precomputed so readers
+        only pick up a ready-made dict.
+        """
+        self.interval = interval
+        size = max(1, int(window / interval))
+        self.buffers = {
+            name: deque(maxlen=size)
+            for name in ("cpu", "mem_percent", "disk_read", "disk_write", "net_sent", "net_recv")
+        }
+        self.per_core = deque(maxlen=size)
+        self.memory = None
+        self.summary = {}
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="system-sampler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def stats(self):
+        """
+        Latest summary: {"cpu": {"last", "min", "avg", "max"}, ..., "per_core": [...], "memory": ...}.
+        """
+        return self.summary
+
+    def snapshot(self):
+        """
+        The latest summary in JSON-friendly form.
+        """
+        summary = dict(self.summary)
+        if summary.get("memory") is not None:
+            summary["memory"] = summary["memory"]._asdict()
+        return summary
+
+    def run(self):
+        # Imported in the sampler thread, so it doesn't hold up startup
+        import psutil
+        # The first cpu_percent(interval=None) call only sets the baseline
+        psutil.cpu_percent(interval=None, percpu=True)
+        last_disk, last_net, last_time = psutil.disk_io_counters(), psutil.net_io_counters(), time.monotonic()
+        while not self.stop_event.wait(self.interval):
+            try:
+                now = time.monotonic()
+                elapsed = max(now - last_time, 1e-9)
+                with profiler.stage("sampler.psutil"):
+                    per_core = psutil.cpu_percent(interval=None, percpu=True)
+                    memory = psutil.virtual_memory()
+                    disk, net = psutil.disk_io_counters(), psutil.net_io_counters()
+
+                self.buffers["cpu"].append(sum(per_core) / len(per_core) if per_core else 0.0)
+                self.per_core.append(per_core)
+                self.buffers["mem_percent"].append(memory.percent)
+                if disk and last_disk:
+                    self.buffers["disk_read"].append((disk.read_bytes - last_disk.read_bytes) / elapsed)
+                    self.buffers["disk_write"].append((disk.write_bytes - last_disk.write_bytes) / elapsed)
+                if net and last_net:
+                    self.buffers["net_sent"].append((net.bytes_sent - last_net.bytes_sent) / elapsed)
+                    self.buffers["net_recv"].append((net.bytes_recv - last_net.bytes_recv) / elapsed)
+                last_disk, last_net, last_time = disk, net, now
+                self.memory = memory
+
+                self.summary = self.summarize()
+            except Exception as e:
+                logging.error(f"Failed to sample system stats: {e}")
+
+    def summarize(self):
+        summary = {
+            name: {"last": values[-1], "min": min(values), "avg": sum(values) / len(values), "max": max(values)}
+            for name, values in self.buffers.items() if values
+        }
+        summary["per_core"] = [sum(core) / len(core) for core in zip(*self.per_core)]
+        summary["memory"] = self.memory
+        return summary
+
+
+def format_system_stats(stats):
+    """
+    Status bar text for CPU and MEM from a SystemSampler summary.
+    """
+    cpu = stats.get("cpu")
+    memory = stats.get("memory")
+    if not cpu or not memory:
+        return {"cpu": "CPU: N/A", "mem": "MEM: N/A"}
+    total_memory_gb = memory.total / (1024 ** 3)
+    used_memory_gb = memory.used / (1024 ** 3)
+    return {
+        "cpu": f"CPU: {cpu['last']:.1f}% (avg {cpu['avg']:.1f}%, max {cpu['max']:.1f}%)",
+        "mem": f"MEM: {used_memory_gb:.1f}/{total_memory_gb:.1f}GB ({memory.percent:.1f}%)",
+    }